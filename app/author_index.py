@@ -0,0 +1,234 @@
+import bisect
+import gzip
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+from shared.config import Config
+from shared.concurrency import submit
+from shared.registry import get_firestore_service, get_storage_service
+
+# Fields of the stored author documents needed to answer a search
+AUTHOR_FIELDS = ["name", "affiliation", "email", "citedby", "scholar_id"]
+
+
+def normalize_tokens(text):
+    """Lowercase, accent-free alphanumeric tokens of `text` ("Ipeirotis, Panos" -> ["ipeirotis", "panos"])."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def is_confident_match(query, authors, limit=10):
+    """
+    Whether index results can answer `query` without Google Scholar: a full page of
+    results, or an author whose name has every query token as a whole token. Other
+    results may only be authors whose names start like the one searched for.
+    """
+    if len(authors) >= limit:
+        return True
+    tokens = set(normalize_tokens(query))
+    return bool(tokens) and any(tokens <= set(normalize_tokens(author["name"])) for author in authors)
+
+
+class AuthorNameIndex:
+    """
+    In-memory search index over the names of the authors stored in Firestore.
+
+    Every name token maps to the authors having it; a sorted list of the tokens
+    supports prefix matching. A query matches the authors having, for every query
+    token, a name token starting with it, and results are ranked by citations.
+
+    The index is loaded from a snapshot in the bucket (or built from Firestore when
+    there is none) in the background, and then refreshed incrementally with the
+    authors updated since the latest timestamp it has seen.
+    """
+
+    def __init__(self, snapshot_blob=None, refresh_interval=None):
+        self.snapshot_blob = snapshot_blob or Config.AUTHOR_INDEX_SNAPSHOT_BLOB
+        self.refresh_interval = Config.AUTHOR_INDEX_REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        self.ready = False
+        self.latest_timestamp = None
+        self._authors = {}
+        self._postings = {}
+        self._tokens = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0
+        self._last_snapshot = 0
+
+    def __len__(self):
+        return len(self._authors)
+
+    def add(self, author):
+        """Add or replace an author (a dict with the AUTHOR_FIELDS)."""
+        with self._lock:
+            for token in self._add(author):
+                bisect.insort(self._tokens, token)
+
+    def add_many(self, authors):
+        """Add or replace several authors, sorting the new tokens once rather than per author."""
+        authors = list(authors)  # read (e.g. from Firestore) before blocking searches
+        with self._lock:
+            new_tokens = []
+            for author in authors:
+                new_tokens.extend(self._add(author))
+            if new_tokens:
+                self._tokens = list(heapq.merge(self._tokens, sorted(new_tokens)))
+        return len(authors)
+
+    def _add(self, author):
+        # Returns the tokens new to the index, which the caller adds to the sorted list
+        scholar_id = author.get("scholar_id")
+        if not scholar_id:
+            return []
+        entry = {field: author.get(field) for field in AUTHOR_FIELDS}
+        entry["citedby"] = entry["citedby"] or 0
+        previous = self._authors.get(scholar_id)
+        if previous is not None:
+            for token in set(normalize_tokens(previous["name"])):
+                self._postings[token].discard(scholar_id)
+        self._authors[scholar_id] = entry
+        new_tokens = []
+        for token in set(normalize_tokens(entry["name"])):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                new_tokens.append(token)
+            postings.add(scholar_id)
+        return new_tokens
+
+    def _matching(self, prefix):
+        ids = set()
+        start = bisect.bisect_left(self._tokens, prefix)
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            ids |= self._postings[token]
+        return ids
+
+    def search(self, query, limit=10):
+        """
+        Return up to `limit` authors matching `query`, most cited first, or None
+        if the index is not loaded yet.
+        """
+        if not self.ready:
+            return None
+        self.refresh_if_stale()
+
+        tokens = normalize_tokens(query)
+        if not tokens:
+            return []
+        with self._lock:
+            # Start from the most selective token
+            candidates = None
+            for token in sorted(set(tokens), key=len, reverse=True):
+                matches = self._matching(token)
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+            authors = [self._authors[scholar_id] for scholar_id in candidates]
+        authors.sort(key=lambda author: author["citedby"], reverse=True)
+        return [dict(author) for author in authors[:limit]]
+
+    def _load_documents(self, updated_after=None):
+        fields = [f"data.{field}" for field in AUTHOR_FIELDS]
+
+        def authors():
+            for _, author, timestamp in get_firestore_service().stream_documents(
+                Config.FIRESTORE_COLLECTION_AUTHOR, fields=fields, updated_after=updated_after
+            ):
+                if timestamp is not None and (self.latest_timestamp is None or timestamp > self.latest_timestamp):
+                    self.latest_timestamp = timestamp
+                if author:
+                    yield author
+
+        return self.add_many(authors())
+
+    def load(self):
+        """Load the index from the snapshot and catch up with Firestore, or build it from scratch."""
+        try:
+            if self.load_snapshot():
+                self.refresh()
+            else:
+                count = self._load_documents()
+                logging.info(f"Built author name index with {count} authors")
+                self.save_snapshot()
+            self._last_refresh = self._last_snapshot = time.monotonic()
+            self.ready = True
+        except Exception as e:
+            logging.error(f"Error loading the author name index: {e}")
+
+    def load_in_background(self):
+        return submit(self.load)
+
+    def refresh(self):
+        """Add the authors updated since the latest timestamp seen."""
+        count = self._load_documents(updated_after=self.latest_timestamp)
+        if count:
+            logging.info(f"Refreshed author name index with {count} authors")
+        return count
+
+    def refresh_if_stale(self):
+        """Schedule a background refresh if the last one is older than the refresh interval."""
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        self._last_refresh = time.monotonic()
+
+        def run():
+            try:
+                if self.refresh() and time.monotonic() - self._last_snapshot >= Config.AUTHOR_INDEX_SNAPSHOT_INTERVAL:
+                    self._last_snapshot = time.monotonic()
+                    self.save_snapshot()
+            except Exception as e:
+                logging.error(f"Error refreshing the author name index: {e}")
+            finally:
+                self._refresh_lock.release()
+
+        submit(run)
+
+    def load_snapshot(self):
+        if not self.snapshot_blob:
+            return False
+        data = get_storage_service().download_bytes(self.snapshot_blob)
+        if not data:
+            return False
+        snapshot = json.loads(gzip.decompress(data))
+        self.add_many(snapshot["authors"])
+        if snapshot.get("latest_timestamp"):
+            self.latest_timestamp = datetime.fromisoformat(snapshot["latest_timestamp"])
+        logging.info(f"Loaded author name index snapshot with {len(snapshot['authors'])} authors")
+        return True
+
+    def save_snapshot(self):
+        if not self.snapshot_blob:
+            return
+        with self._lock:
+            authors = list(self._authors.values())
+        snapshot = {
+            "latest_timestamp": self.latest_timestamp.isoformat() if self.latest_timestamp else None,
+            "authors": authors,
+        }
+        data = gzip.compress(json.dumps(snapshot).encode("utf-8"))
+        get_storage_service().upload_bytes(self.snapshot_blob, data, content_type="application/gzip")
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_author_index():
+    """The process-wide author name index."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AuthorNameIndex()
+    return _index
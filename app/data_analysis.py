@@ -1,45 +1,78 @@
 import logging
+import threading
 
-from shared.services.firestore_service import FirestoreService
-from shared.services.bigquery_service import BigQueryService
-from shared.repositories.author_repository import AuthorRepository
-from shared.repositories.publication_repository import PublicationRepository
+from shared.config import Config
+from shared.concurrency import submit
+from shared.registry import (
+    get_firestore_service,
+    get_bigquery_service,
+    get_author_repository,
+    get_storage_service,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Initialize services and repositories
-firestore_service = FirestoreService()
-bigquery_service = BigQueryService()
-publication_repository = PublicationRepository(firestore_service)
-author_repository = AuthorRepository(firestore_service, publication_repository)
-
 
 def get_author_stats(author_id):
-    # Fetch author details
-    author = author_repository.get_author(author_id)
+    firestore_service = get_firestore_service()
+    bigquery_service = get_bigquery_service()
+    author_repository = get_author_repository()
+
+    # Fetch the author together with its cached stats in a single round trip
+    docs = firestore_service.get_many(
+        [
+            (Config.FIRESTORE_COLLECTION_AUTHOR, author_id),
+            (Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id),
+            ("author_pub_stats", author_id),
+            ("author_stats", author_id),
+        ]
+    )
+    author, author_timestamp = docs[(Config.FIRESTORE_COLLECTION_AUTHOR, author_id)]
     if not author:
         logging.warning(f"No author found with ID: {author_id}")
         return None
 
     # Check for last modification to determine if cache needs refresh
-    author_last_modified = author_repository.get_author_last_modification(author_id)
+    _, watermark = docs[(Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id)]
+    author_last_modified = author_repository.get_author_last_modification(author_id, author_timestamp, watermark)
 
     author["last_modified"] = author_last_modified
 
-    # Fetch and cache author publication stats
-    author_pub_stats, pub_stats_timestamp = firestore_service.get_firestore_cache("author_pub_stats", author_id)
-    if not author_pub_stats or author_last_modified > pub_stats_timestamp:
-        author_pub_stats = bigquery_service.get_author_pub_stats(author_id)
-        if author_pub_stats:
-            firestore_service.set_firestore_cache("author_pub_stats", author_id, author_pub_stats)
+    # Outdated stats are served as they are while they are recomputed in the
+    # background; only missing or too stale stats are waited for. Both BigQuery
+    # jobs run concurrently.
+    author_pub_stats, pub_stats_timestamp = docs[("author_pub_stats", author_id)]
+    pub_stats_future = stats_future(
+        "author_pub_stats",
+        author_id,
+        author_pub_stats,
+        pub_stats_timestamp,
+        author_last_modified,
+        bigquery_service.get_author_pub_stats,
+    )
+    author_stats, stats_timestamp = docs[("author_stats", author_id)]
+    author_stats_future = stats_future(
+        "author_stats", author_id, author_stats, stats_timestamp, author_last_modified, bigquery_service.get_author_stats
+    )
+    # Plots are cached by this time, so it must be that of the stats actually served
+    stats_last_modified = author_last_modified
+    if pub_stats_future is not None:
+        author_pub_stats = pub_stats_future.result()
+    elif author_pub_stats:
+        stats_last_modified = min(stats_last_modified, pub_stats_timestamp)
+    if author_stats_future is not None:
+        author_stats = author_stats_future.result()
+    elif author_stats:
+        stats_last_modified = min(stats_last_modified, stats_timestamp)
+    author["stats_last_modified"] = stats_last_modified
 
-    # Fetch and cache author stats
-    author_stats, stats_timestamp = firestore_service.get_firestore_cache("author_stats", author_id)
-    if not author_stats or author_last_modified > stats_timestamp:
-        author_stats = bigquery_service.get_author_stats(author_id)
-        if author_stats:
-            firestore_service.set_firestore_cache("author_stats", author_id, author_stats)
+    # Authors scraped after the last warehouse refresh have no stats in BigQuery yet;
+    # score their publications locally from the percentile tables instead.
+    if not author_pub_stats:
+        author_pub_stats = score_publications_locally(author_id, author)
+    if not author_stats:
+        author_stats = score_author_stats_locally(author_id, author, author_pub_stats)
 
     author["publications"] = author_pub_stats or []
     author["stats"] = author_stats or {}
@@ -47,21 +80,124 @@ def get_author_stats(author_id):
     return author
 
 
+def stats_future(collection, doc_id, cached, cached_timestamp, last_modified, compute):
+    """
+    Stale-while-revalidate lookup of the cached stats `collection`/`doc_id`.
+
+    If the cached stats are older than `last_modified`, `compute(doc_id)` is
+    scheduled to recompute and cache them. The caller can keep using `cached`
+    (None is returned) unless they are missing or more than
+    Config.STATS_MAX_STALENESS seconds behind `last_modified`, in which case the
+    future of the recomputed stats is returned to be waited for.
+    """
+    # Empty stats are cached too (see recompute_stats), so they count as present
+    cached = cached is not None
+    if cached and not last_modified > cached_timestamp:
+        return None
+    future = revalidate(collection, doc_id, compute)
+    if cached and (last_modified - cached_timestamp).total_seconds() <= Config.STATS_MAX_STALENESS:
+        return None
+    return future
+
+
+# (collection, doc_id) -> future of the recomputation in progress
+_revalidations = {}
+_revalidations_lock = threading.Lock()
+
+
+def revalidate(collection, doc_id, compute):
+    """Recompute and cache stats on the I/O pool, at most once at a time per document."""
+    key = (collection, doc_id)
+    with _revalidations_lock:
+        future = _revalidations.get(key)
+        started = future is None
+        if started:
+            future = _revalidations[key] = submit(recompute_stats, collection, doc_id, compute)
+    if started:
+        # Outside the lock: the callback takes it, and runs right away if the
+        # recomputation has already finished
+        future.add_done_callback(lambda _: _forget_revalidation(key))
+    return future
+
+
+def _forget_revalidation(key):
+    with _revalidations_lock:
+        _revalidations.pop(key, None)
+
+
+def recompute_stats(collection, doc_id, compute):
+    try:
+        stats = compute(doc_id)
+    except Exception as e:
+        logging.error(f"Error recomputing {collection} for {doc_id}: {e}")
+        raise
+    # An empty result (e.g. an author not in the warehouse yet) is cached as well,
+    # so that the query is not repeated on every view until the author changes
+    get_firestore_service().set_firestore_cache(collection, doc_id, stats if stats is not None else {})
+    return stats
+
+
+def score_publications_locally(author_id, author):
+    from shared.scoring import get_scorer  # NumPy is only needed on this path
+
+    try:
+        # The author document may be a header whose publications are stored in shards
+        author = get_author_repository().with_publications(author_id, author)
+        return get_scorer().score_author(author.get("publications", []))
+    except Exception as e:
+        logging.error(f"Error scoring publications locally for {author_id}: {e}")
+        return []
+
+
+def score_author_stats_locally(author_id, author, scored_publications):
+    from shared.scoring import get_scorer
+
+    try:
+        return get_scorer().score_author_stats(author, scored_publications or [])
+    except Exception as e:
+        logging.error(f"Error computing author stats locally for {author_id}: {e}")
+        return {}
+
+
 def get_publication_stats(author_id, author_pub_id):
-    pub = publication_repository.get_publication(author_pub_id)
+    firestore_service = get_firestore_service()
+    bigquery_service = get_bigquery_service()
+    author_repository = get_author_repository()
+
+    # Fetch the publication, its author and the cached stats in a single round trip
+    docs = firestore_service.get_many(
+        [
+            (Config.FIRESTORE_COLLECTION_PUB, author_pub_id),
+            (Config.FIRESTORE_COLLECTION_AUTHOR, author_id),
+            (Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id),
+            ("pub_stats", author_pub_id),
+        ]
+    )
+    pub, _ = docs[(Config.FIRESTORE_COLLECTION_PUB, author_pub_id)]
     if not pub:
         logging.warning(f"No publication found with ID: {author_pub_id}")
         return None
 
-    author_last_modified = author_repository.get_author_last_modification(author_id)
+    _, author_timestamp = docs[(Config.FIRESTORE_COLLECTION_AUTHOR, author_id)]
+    _, watermark = docs[(Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id)]
+    author_last_modified = author_repository.get_author_last_modification(author_id, author_timestamp, watermark)
 
     pub["last_modified"] = author_last_modified
 
-    pub_stats, pub_stats_timestamp = firestore_service.get_firestore_cache("pub_stats", author_pub_id)
-    if not pub_stats or author_last_modified > pub_stats_timestamp:
-        pub_stats = bigquery_service.get_publication_stats(author_pub_id)
-        if pub_stats:
-            firestore_service.set_firestore_cache("pub_stats", author_pub_id, pub_stats)
+    pub_stats, pub_stats_timestamp = docs[("pub_stats", author_pub_id)]
+    future = stats_future(
+        "pub_stats",
+        author_pub_id,
+        pub_stats,
+        pub_stats_timestamp,
+        author_last_modified,
+        bigquery_service.get_publication_stats,
+    )
+    if future is not None:
+        pub_stats = future.result()
+        pub["stats_last_modified"] = author_last_modified
+    else:
+        pub["stats_last_modified"] = min(author_last_modified, pub_stats_timestamp)
 
     # Append stats to author object
     if pub_stats:
@@ -73,7 +209,76 @@ def get_publication_stats(author_id, author_pub_id):
     return pub
 
 
-def download_all_authors_stats():
-    # Assuming bigquery_service is an instance of your BigQueryService class
-    df = bigquery_service.get_all_authors_stats()
-    return df
+# Serializes exports within this instance; the lock blob does so across instances
+_export_lock = threading.Lock()
+
+
+def export_all_authors_stats():
+    """
+    Regenerate the CSV and Parquet exports of all author stats, unless another
+    request (on this or another instance) is already doing so.
+
+    :return: True if the exports were written by this call.
+    """
+    storage_service = get_storage_service()
+    if not _export_lock.acquire(blocking=False):
+        return False
+    try:
+        generation = storage_service.acquire_lock(Config.ALL_AUTHORS_STATS_LOCK_BLOB, Config.EXPORT_LOCK_TTL)
+        if generation is None:
+            logging.info("All authors stats export already in progress elsewhere")
+            return False
+        try:
+            # Another instance may have finished an export while we waited for the lock
+            if all(
+                storage_service.file_updated_within_24_hours(blob_name)
+                for blob_name in (Config.ALL_AUTHORS_STATS_CSV_BLOB, Config.ALL_AUTHORS_STATS_PARQUET_BLOB)
+            ):
+                return False
+            return write_all_authors_stats(storage_service) > 0
+        finally:
+            storage_service.release_lock(Config.ALL_AUTHORS_STATS_LOCK_BLOB, generation)
+    finally:
+        _export_lock.release()
+
+
+def write_all_authors_stats(storage_service):
+    """
+    Stream the stats of all authors from BigQuery into the CSV and Parquet blobs,
+    one record batch at a time, through chunked resumable uploads.
+    """
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    rows = 0
+    csv_writer = parquet_writer = None
+    csv_file = storage_service.open_writer(Config.ALL_AUTHORS_STATS_CSV_BLOB, "text/csv")
+    parquet_file = storage_service.open_writer(Config.ALL_AUTHORS_STATS_PARQUET_BLOB, "application/vnd.apache.parquet")
+    try:
+        for batch in get_bigquery_service().iter_all_authors_stats():
+            if csv_writer is None:
+                csv_writer = pa_csv.CSVWriter(csv_file, batch.schema)
+                parquet_writer = pq.ParquetWriter(parquet_file, batch.schema)
+            csv_writer.write_batch(batch)
+            parquet_writer.write_batch(batch)
+            rows += batch.num_rows
+    except BaseException:
+        # Cancel the uploads, so that the previous exports stay in place
+        csv_file.terminate()
+        parquet_file.terminate()
+        raise
+
+    if csv_writer is None:
+        logging.warning("No author stats to export; keeping the previous exports")
+        csv_file.terminate()
+        parquet_file.terminate()
+        return 0
+
+    # The Parquet file is closed first, so that a fresh CSV means both exports are complete
+    parquet_writer.close()
+    parquet_file.close()
+    csv_writer.close()
+    csv_file.close()
+
+    logging.info(f"Exported stats of {rows} authors")
+    return rows
@@ -0,0 +1,156 @@
+import io
+import csv
+import json
+import math
+import zlib
+
+from shared.config import Config
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def record_columns(records):
+    """Column names in first-seen order across all records (as pandas would build them)."""
+    columns = {}
+    for record in records:
+        for key in record:
+            columns.setdefault(key, None)
+    return list(columns)
+
+
+def _csv_value(value):
+    # Missing values are empty cells, as pandas' to_csv writes them
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+
+def iter_csv(records, columns, chunk_size=None):
+    """Yield the CSV encoding of `records` in chunks of roughly `chunk_size` bytes."""
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, restval="", extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for record in records:
+        writer.writerow({k: _csv_value(v) for k, v in record.items()})
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _json_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def iter_jsonl(records, chunk_size=None):
+    """Yield one JSON object per line, in chunks of roughly `chunk_size` bytes."""
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    lines = []
+    size = 0
+    for record in records:
+        line = json.dumps({k: _json_value(v) for k, v in record.items()}, default=str) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(lines).encode("utf-8")
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands whatever was written back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_parquet(records, columns, batch_rows=None):
+    """
+    Yield a Parquet file written one row group per `batch_rows` records.
+
+    Each column takes the type of its first non-null value (integer columns holding
+    floats, e.g. NaN for missing values, become float64). Row groups are yielded
+    as soon as they are written, so only one batch is encoded at a time.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    batch_rows = batch_rows or Config.EXPORT_PARQUET_BATCH_ROWS
+    types = {}
+    for record in records:
+        for column, value in record.items():
+            if value is None:
+                continue
+            if column not in types:
+                types[column] = pa.scalar(value).type
+            elif isinstance(value, float) and pa.types.is_integer(types[column]):
+                types[column] = pa.float64()
+    schema = pa.schema([(c, types.get(c, pa.null())) for c in columns])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for start in range(0, len(records), batch_rows):
+        batch = records[start : start + batch_rows]
+        writer.write_table(pa.Table.from_pylist([{c: r.get(c) for c in columns} for r in batch], schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip-compress a stream of byte chunks without buffering the whole stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_records(records, fmt="csv", compress=False):
+    """
+    Encode `records` (a list of dicts) as `fmt`, optionally gzipped.
+
+    Returns (chunks, mimetype, extension). Parquet is compressed internally, so
+    `compress` only applies to the text formats.
+    """
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    if fmt == "csv":
+        chunks = iter_csv(records, record_columns(records))
+    elif fmt == "jsonl":
+        chunks = iter_jsonl(records)
+    else:
+        chunks = iter_parquet(records, record_columns(records))
+
+    if compress and fmt != "parquet":
+        return gzip_chunks(chunks), "application/gzip", f"{extension}.gz"
+    return chunks, mimetype, extension
@@ -5,37 +5,65 @@ from flask import (
     redirect,
     url_for,
     flash,
-    send_file,
     jsonify,
+    abort,
+    make_response,
+    Response,
+    stream_with_context,
 )
 
 
-import os
+import json
 import logging
 import datetime
-import pandas as pd
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from shared.config import Config
+from shared.concurrency import submit, result_or_default
+from shared.registry import get_storage_service, get_author_repository
 from scholar import get_similar_authors
+from author_index import get_author_index
 from data_analysis import (
     get_author_stats,
-    download_all_authors_stats,
+    export_all_authors_stats,
     get_publication_stats,
 )
-from visualization import generate_percentile_rank_plot, generate_pip_plot, generate_pub_citation_plot
 from queue_handler import put_author_in_queue, pending_tasks, number_of_tasks_in_queue
-from refresh import refresh_authors
-
-
-from shared.services.storage_service import StorageService
+from refresh import refresh_authors, authors_to_refresh, iter_refresh_authors, summarize_refresh
+from exports import EXPORT_FORMATS, stream_records
+from plot_cache import PlotCache
+from plot_renderer import get_renderer
 
+# pandas and the plotting code (matplotlib) are imported inside the routes that
+# use them, and service clients are created on first use, to keep cold starts short.
 
 logging.basicConfig(level=logging.INFO)
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-storage_service = StorageService()
+plot_cache = PlotCache(persist=Config.PLOT_CACHE_PERSIST)
+
+
+def start_background_services():
+    """
+    Start the work the server needs besides handling requests. Called when the
+    server starts, not at import time: restarted plot workers (forkserver/spawn)
+    import this module again as __mp_main__, and must not start them too.
+    """
+    # Start the plot workers in the background; they import matplotlib themselves
+    if Config.PLOT_RENDER_WARM_UP:
+        get_renderer().warm_up(wait=False)
+    # Load the author name index in the background (after the plot workers are forked)
+    if Config.AUTHOR_INDEX_ENABLED:
+        get_author_index().load_in_background()
+
+
+# Plot type -> name of the generating function in visualization.py
+AUTHOR_PLOTS = {
+    "percentile_rank": "generate_percentile_rank_plot",
+    "pip": "generate_pip_plot",
+}
 
 
 @app.route("/")
@@ -51,13 +79,19 @@ def data():
 
 @app.route("/download_all_authors_stats")
 def download_all_authors_stats_route():
+    # The CSV is the default download; format=parquet gets the columnar export
+    destination_blob_name = Config.ALL_AUTHORS_STATS_CSV_BLOB
+    if request.args.get("format") == "parquet":
+        destination_blob_name = Config.ALL_AUTHORS_STATS_PARQUET_BLOB
     # Construct the URL to the file in the GCS bucket
-    destination_blob_name = "all_authors_stats.csv"
     file_url = f"https://storage.googleapis.com/{Config.BUCKET_NAME}/{destination_blob_name}"
 
+    storage_service = get_storage_service()
     if not storage_service.file_updated_within_24_hours(destination_blob_name):
-        df = download_all_authors_stats()
-        storage_service.upload_csv_to_gcs(df, destination_blob_name)
+        # Only one request regenerates the exports; the others get the previous
+        # (stale) files, or are asked to retry if there are none yet.
+        if not export_all_authors_stats() and not storage_service.file_exists(destination_blob_name):
+            return "The export is being generated, please try again in a few minutes.", 503, {"Retry-After": "60"}
 
     # Use this function to get a signed URL and redirect the user to it
     # file_url = storage_service.generate_signed_url(destination_blob_name)
@@ -101,6 +135,20 @@ def refresh_authors_route():
     except Exception as e:
         num_authors = 1
 
+    # With stream=true, progress is reported as one JSON line per author followed
+    # by the summary, so that large refreshes do not wait for the last task
+    if request.args.get("stream", "").lower() == "true":
+        scholar_ids = authors_to_refresh(scholar_ids, num_authors)
+
+        def progress():
+            entries = []
+            for entry in iter_refresh_authors(scholar_ids):
+                entries.append(entry)
+                yield json.dumps(entry) + "\n"
+            yield json.dumps({"summary": summarize_refresh(entries)}) + "\n"
+
+        return Response(stream_with_context(progress()), mimetype="application/x-ndjson")
+
     if scholar_ids:
         result = refresh_authors(scholar_ids, num_authors=num_authors)
     else:
@@ -120,30 +168,119 @@ def results():
         flash("Google Scholar ID is required.")
         return redirect(url_for("index"))
 
-    # Check if there are any tasks about the author in the queue
-    if pending_tasks(author_id):
-        queue_tasks = number_of_tasks_in_queue()
-        return render_template("redirect.html", author_id=author_id, queue_tasks=queue_tasks)
+    # The queue lookups are answered from the queue snapshot, and have deadlines in
+    # case it must be rebuilt from a slow Cloud Tasks: the author is then assumed
+    # not pending, and the queue depth is left out of the page.
+    def queue_depth():
+        return result_or_default(submit(number_of_tasks_in_queue), Config.QUEUE_DEPTH_DEADLINE, None, "queue depth")
+
+    # Check if there are any tasks about the author in the queue. This comes first, so
+    # that the redirect page (which polls every few seconds) never loads the stats.
+    if result_or_default(
+        submit(pending_tasks, author_id), Config.PENDING_TASKS_DEADLINE, False, "pending tasks lookup"
+    ):
+        return render_template("redirect.html", author_id=author_id, queue_tasks=queue_depth())
 
     author = get_author_stats(author_id)
 
     # If there is no author, put the author in the queue and render redirect.html
     if not author:
         put_author_in_queue(author_id)
-        queue_tasks = number_of_tasks_in_queue()
-        return render_template("redirect.html", author_id=author_id, queue_tasks=queue_tasks)
+        return render_template("redirect.html", author_id=author_id, queue_tasks=queue_depth())
+
+    # Page views make authors refresh sooner; counted without delaying the page
+    submit(get_author_repository().record_view, author_id)
+
+    # The plots are served by /plot; versioning their URLs by the time of the
+    # stats they show lets browsers and the plot cache keep them indefinitely.
+    version = plot_version(author["stats_last_modified"])
+    plot1 = url_for("author_plot", author_id=author_id, plot_type="percentile_rank", v=version)
+    plot2 = url_for("author_plot", author_id=author_id, plot_type="pip", v=version)
+
+    return render_template("results.html", author=author, plot1=plot1, plot2=plot2)
+
+
+def plot_version(last_modified):
+    return int(last_modified.timestamp())
+
+
+def publications_dataframe(author):
+    import pandas as pd
 
     df = pd.DataFrame(author["publications"])
-    author_name = author["name"]
     current_year = datetime.datetime.now().year
     df["age"] = current_year - df["pub_year"] + 1
     df["num_citations_percentile"] = 100 * df["num_citations_percentile"]
     df["num_papers_percentile"] = 100 * df["num_papers_percentile"]
+    return df
 
-    plot1 = generate_percentile_rank_plot(df, author_name)
-    plot2 = generate_pip_plot(df, author_name)
 
-    return render_template("results.html", author=author, plot1=plot1, plot2=plot2)
+def png_response(png):
+    response = make_response(png)
+    response.headers["Content-Type"] = "image/png"
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@app.route("/plot/<author_id>/<plot_type>.png")
+def author_plot(author_id, plot_type):
+    if plot_type not in AUTHOR_PLOTS:
+        abort(404)
+
+    # A versioned URL names an immutable image, so a cached one is served without loading the stats
+    version = request.args.get("v", type=int)
+    if version is not None:
+        png = plot_cache.get((author_id, plot_type, version))
+        if png is not None:
+            return png_response(png)
+
+    author = get_author_stats(author_id)
+    if not author:
+        abort(404)
+
+    # Outdated or missing versions are redirected to the current one, which is
+    # the only version whose image can be rendered (and cached as immutable)
+    current_version = plot_version(author["stats_last_modified"])
+    if version != current_version:
+        return redirect(url_for("author_plot", author_id=author_id, plot_type=plot_type, v=current_version))
+
+    import visualization
+
+    generate_plot = getattr(visualization, AUTHOR_PLOTS[plot_type])
+    key = (author_id, plot_type, current_version)
+    try:
+        png = plot_cache.get_or_render(key, lambda: generate_plot(publications_dataframe(author), author["name"]))
+    except FutureTimeoutError:
+        logging.error(f"Timed out rendering {plot_type} plot for {author_id}")
+        return "Plot rendering timed out", 503, {"Retry-After": "5"}
+    return png_response(png)
+
+
+@app.route("/plot/publication/<author_id>/<pub_id>.png")
+def publication_plot(author_id, pub_id):
+    # Versioned like the author plots
+    version = request.args.get("v", type=int)
+    if version is not None:
+        png = plot_cache.get((pub_id, "citations", version))
+        if png is not None:
+            return png_response(png)
+
+    pub_stats = get_publication_stats(author_id, pub_id)
+    if not pub_stats:
+        abort(404)
+
+    current_version = plot_version(pub_stats["stats_last_modified"])
+    if version != current_version:
+        return redirect(url_for("publication_plot", author_id=author_id, pub_id=pub_id, v=current_version))
+
+    import pandas as pd
+    from visualization import generate_pub_citation_plot
+
+    key = (pub_id, "citations", current_version)
+    png = plot_cache.get_or_render(key, lambda: generate_pub_citation_plot(pd.DataFrame(pub_stats["stats"])))
+    if not png:
+        abort(404)
+    return png_response(png)
 
 
 @app.route("/download/<author_id>")
@@ -151,26 +288,29 @@ def download_results(author_id):
     author = get_author_stats(author_id)
 
     # Check if there is data to download
-    if len(author["publications"]) == 0:
+    if not author or len(author["publications"]) == 0:
         flash("No publications found to download.")
         return redirect(url_for("index"))
 
-    downloads_dir = os.path.join(app.root_path, "downloads")
-    if not os.path.exists(downloads_dir):
-        os.makedirs(downloads_dir)  # Create the downloads directory if it doesn't exist
-
-    file_path = os.path.join(downloads_dir, f"{author_id}_results.csv")
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        abort(400, description=f"Unsupported format: {fmt}")
+    compress = request.args.get("compression", "").lower() == "gzip"
 
-    pd.DataFrame(author["publications"]).to_csv(file_path, index=False)
-
-    return send_file(file_path, as_attachment=True, download_name=f"{author_id}_results.csv")
+    # Rows are encoded and sent chunk by chunk; nothing is written to disk
+    chunks, mimetype, extension = stream_records(author["publications"], fmt, compress)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={author_id}_results.{extension}"
+    return response
 
 
 @app.route("/publication/<author_id>/<pub_id>")
 def get_publication_details(author_id, pub_id):
     pub_stats = get_publication_stats(author_id, pub_id)
-    citations_plot = generate_pub_citation_plot(pd.DataFrame(pub_stats["stats"]))
     if pub_stats:
+        citations_plot = url_for(
+            "publication_plot", author_id=author_id, pub_id=pub_id, v=plot_version(pub_stats["stats_last_modified"])
+        )
         return render_template(
             "publication_details.html",
             pub=pub_stats,
@@ -186,4 +326,5 @@ def error():
 
 
 if __name__ == "__main__":
+    start_background_services()
     app.run(host="0.0.0.0", port=8080)
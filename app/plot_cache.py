@@ -0,0 +1,93 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from shared.config import Config
+from shared.registry import get_storage_service
+
+
+class PlotCache:
+    """
+    LRU cache of rendered plots (PNG bytes), bounded by total size.
+
+    Entries are keyed by (object_id, plot_type, version), where the version is the
+    last-modified time of the underlying data, so a refresh of the author produces
+    new keys instead of requiring invalidation. With `persist`, plots are also
+    stored in the GCS bucket and shared between instances.
+    """
+
+    def __init__(self, max_bytes=None, persist=False):
+        self.max_bytes = max_bytes or Config.PLOT_CACHE_MAX_BYTES
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._render_locks = {}
+
+    @staticmethod
+    def blob_name(key):
+        object_id, plot_type, version = key
+        return f"{Config.PLOT_CACHE_GCS_PREFIX}/{object_id}/{plot_type}-{version}.png"
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+
+        if self.persist:
+            try:
+                png = get_storage_service().download_bytes(self.blob_name(key))
+            except Exception as e:
+                logging.error(f"Error reading cached plot {key} from GCS: {e}")
+                png = None
+            if png is not None:
+                self._store(key, png)
+        return png
+
+    def put(self, key, png):
+        self._store(key, png)
+        if self.persist:
+            try:
+                get_storage_service().upload_bytes(self.blob_name(key), png, content_type="image/png")
+            except Exception as e:
+                logging.error(f"Error persisting plot {key} to GCS: {e}")
+
+    def get_or_render(self, key, render):
+        """Return the cached plot for `key`, calling `render()` to produce it on a miss."""
+        png = self.get(key)
+        if png is not None:
+            return png
+
+        # Concurrent requests for the same plot render it only once
+        with self._lock:
+            render_lock = self._render_locks.setdefault(key, threading.Lock())
+        with render_lock:
+            png = self.get(key)
+            if png is None:
+                png = render()
+                if png:
+                    self.put(key, png)
+        with self._lock:
+            self._render_locks.pop(key, None)
+        return png
+
+    def _store(self, key, png):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = png
+            self._size += len(png)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,101 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from shared.config import Config
+
+
+def _init_worker():
+    # Import the plotting stack once per worker, not once per figure
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.figure  # noqa: F401
+    import pandas  # noqa: F401
+
+
+def _ping():
+    return True
+
+
+class PlotRenderer:
+    """
+    Renders plots in a pool of worker processes.
+
+    Matplotlib rendering is CPU-bound and holds the GIL, so rendering in the
+    request thread stalls every other request served by the instance. The
+    render functions submitted here must be module-level functions that take
+    plain (picklable) data and return the PNG bytes.
+    """
+
+    def __init__(self, max_workers=None, timeout=None):
+        self.max_workers = max_workers or Config.PLOT_RENDER_WORKERS
+        self.timeout = timeout or Config.PLOT_RENDER_TIMEOUT
+        self._executor = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _start_method(self):
+        methods = multiprocessing.get_all_start_methods()
+        # The first workers are forked so they inherit the already imported modules;
+        # warm_up() is called at startup, before the server starts its threads.
+        if not self._started and "fork" in methods:
+            return "fork"
+        # Later on the process runs threads (and holds gRPC channels) that a fork
+        # would copy in an inconsistent state, so restarted workers come from a
+        # fork server (or are spawned) instead.
+        return "forkserver" if "forkserver" in methods else "spawn"
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context(self._start_method())
+                self._started = True
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=context, initializer=_init_worker
+                )
+            return self._executor
+
+    def warm_up(self, wait=True):
+        """Start all the worker processes, so that the first render does not pay for it."""
+        executor = self._get_executor()
+        futures = [executor.submit(_ping) for _ in range(self.max_workers)]
+        if wait:
+            for future in futures:
+                future.result()
+
+    def render(self, render_function, *args, timeout=None):
+        """
+        Run `render_function(*args)` in a worker process and return its result.
+
+        Raises concurrent.futures.TimeoutError if the plot is not ready within the timeout.
+        """
+        try:
+            future = self._get_executor().submit(render_function, *args)
+        except BrokenProcessPool:
+            logging.error("Plot rendering pool is broken; restarting it.")
+            self.shutdown()
+            future = self._get_executor().submit(render_function, *args)
+        return future.result(timeout=timeout or self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    """Return the process-wide PlotRenderer."""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PlotRenderer()
+    return _renderer
@@ -1,73 +1,82 @@
 import logging
 from shared.config import Config
-from shared.services.firestore_service import FirestoreService
-from shared.services.task_queue_service import TaskQueueService
-from shared.repositories.author_repository import AuthorRepository
-from shared.repositories.publication_repository import PublicationRepository
+from shared.registry import get_firestore_service, get_task_queue_service, get_author_repository
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Initialize services
-firestore_service = FirestoreService()
-task_queue_service = TaskQueueService()
-publication_repository = PublicationRepository(firestore_service)
-author_repository = AuthorRepository(
-    firestore_service, publication_repository
-)  # Assuming publication_repository is None or similarly initialized
-
 
 def get_authors_to_refresh(num_authors=10):
     # Use the AuthorRepository to fetch authors needing refresh
-    return author_repository.get_authors_needing_refresh(num_authors)
+    return get_author_repository().get_authors_needing_refresh(num_authors)
 
 
-def refresh_authors(refresh=[], num_authors=1):
-    if not refresh:
-        refresh = get_authors_to_refresh(num_authors)
-
-    total_authors = 0
-    total_pubs = 0
-    authors = []
-
-    for scholar_id in refresh:
-        doc = firestore_service.db.collection(Config.FIRESTORE_COLLECTION_AUTHOR).document(scholar_id).get()
-        if not doc.exists:
-            # Enqueue author task if document does not exist
-            if task_queue_service.enqueue_author_task(scholar_id):
-                total_authors += 1
-                authors.append({"author_id": scholar_id})
-            continue
-
-        author = doc.to_dict().get("data")
-        if not author:
-            # Handle the case where the document exists but has no relevant data
-            if task_queue_service.enqueue_author_task(scholar_id):
-                total_authors += 1
-                authors.append({"doc_id": doc.id, "author_id": scholar_id})
-            continue
-
-        author_id = author.get("scholar_id")
-        # Enqueue the author for updating
-        if task_queue_service.enqueue_author_task(scholar_id):
-            publications = author.get("publications", [])
-            total_authors += 1
-            total_pubs += len(publications)
-            authors.append(
-                {
-                    "doc_id": doc.id,
-                    "author_id": author_id,
-                    "publications": len(publications),
+def iter_refresh_authors(scholar_ids, batch_size=None):
+    """
+    Enqueue a refresh task for each author, yielding one progress entry per author.
+
+    The author documents are read in batches of `batch_size` with a single Firestore
+    call each, and the tasks of a batch are created concurrently.
+    """
+    firestore_service = get_firestore_service()
+    task_queue_service = get_task_queue_service()
+    batch_size = batch_size or Config.REFRESH_BATCH_SIZE
+    scholar_ids = list(dict.fromkeys(scholar_id for scholar_id in scholar_ids if scholar_id))
+
+    for start in range(0, len(scholar_ids), batch_size):
+        batch = scholar_ids[start : start + batch_size]
+        docs = firestore_service.get_many(
+            [(Config.FIRESTORE_COLLECTION_AUTHOR, scholar_id) for scholar_id in batch], use_local_cache=False
+        )
+
+        entries = {}
+        for scholar_id in batch:
+            author, timestamp = docs[(Config.FIRESTORE_COLLECTION_AUTHOR, scholar_id)]
+            if timestamp is None:
+                # The author document does not exist yet
+                entries[scholar_id] = {"author_id": scholar_id}
+            elif not author:
+                # The document exists but has no relevant data
+                entries[scholar_id] = {"doc_id": scholar_id, "author_id": scholar_id}
+            else:
+                entries[scholar_id] = {
+                    "doc_id": scholar_id,
+                    "author_id": author.get("scholar_id"),
+                    "publications": get_author_repository().num_publications(author),
                     "name": author.get("name"),
                 }
-            )
 
-        # Additional logic for handling document IDs not matching author IDs could go here
-        # For example, deleting or updating records as necessary
+        for scholar_id, status in task_queue_service.iter_enqueue_author_tasks(batch):
+            entry = entries[scholar_id]
+            entry["status"] = status
+            yield entry
+
 
-    return {
-        "total_authors": total_authors,
-        "total_publications": total_pubs,
-        "authors": authors,
+def summarize_refresh(entries):
+    """Aggregate the entries yielded by iter_refresh_authors into the refresh report."""
+    report = {
+        "total_authors": 0,
+        "total_publications": 0,
+        "duplicates": 0,
+        "failed": [],
+        "authors": [],
     }
+    for entry in entries:
+        if entry["status"] == "enqueued":
+            report["total_authors"] += 1
+            report["total_publications"] += entry.get("publications", 0)
+            report["authors"].append({key: value for key, value in entry.items() if key != "status"})
+        elif entry["status"] == "duplicate":
+            report["duplicates"] += 1
+        else:
+            report["failed"].append(entry.get("doc_id") or entry["author_id"])
+    return report
+
+
+def authors_to_refresh(refresh=None, num_authors=1):
+    return refresh if refresh else get_authors_to_refresh(num_authors)
+
+
+def refresh_authors(refresh=[], num_authors=1):
+    return summarize_refresh(iter_refresh_authors(authors_to_refresh(refresh, num_authors)))
@@ -1,36 +1,58 @@
 import logging
-from scholarly import scholarly
-from shared.services.firestore_service import FirestoreService
+from shared.config import Config
+from shared.registry import get_firestore_service
+from shared.rate_limit import scholar_call
+from author_index import get_author_index, is_confident_match
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
-# Initialize services and repositories
-firestore_service = FirestoreService()
-
 
 def get_similar_authors(author_name):
+    # Authors already in the database are found in the local name index; names it
+    # has no confident match for also go through the query cache and Google Scholar,
+    # so that new authors whose names start like stored ones can still be found.
+    index_authors = []
+    if Config.AUTHOR_INDEX_ENABLED:
+        index_authors = get_author_index().search(author_name) or []
+        if is_confident_match(author_name, index_authors):
+            logging.info(f"Index hit for similar authors of '{author_name}'.")
+            return index_authors
+
+    firestore_service = get_firestore_service()
+
     # Fetch similar authors with caching logic
     cached_data, _ = firestore_service.get_firestore_cache("queries", author_name)
     if cached_data:
         logging.info(f"Cache hit for similar authors of '{author_name}'.")
-        return cached_data
+        return merge_authors(index_authors, cached_data)
 
     authors = fetch_authors_from_scholarly(author_name)
     if authors:
-        # Cache the fetched authors data
+        # Cache the fetched authors data; they are not stored authors, so they
+        # stay out of the name index until they are fetched into scholar_raw_author
         firestore_service.set_firestore_cache("queries", author_name, authors)
-    return authors
+    return merge_authors(index_authors, authors)
+
+
+def merge_authors(index_authors, other_authors):
+    # Stored authors first, then those only found through Google Scholar
+    seen = {author["scholar_id"] for author in index_authors}
+    return index_authors + [author for author in other_authors if author.get("scholar_id") not in seen]
 
 
 def fetch_authors_from_scholarly(author_name):
-    # Fetch authors using the scholarly package
+    # Fetch authors using the scholarly package, imported on first use as it is slow to load
+    from scholarly import scholarly
+
+    # Each request to Google Scholar goes through the shared rate limiter
+    timeout = Config.SCHOLAR_INTERACTIVE_ACQUIRE_TIMEOUT
     authors = []
     try:
-        search_query = scholarly.search_author(author_name)
+        search_query = scholar_call(scholarly.search_author, author_name, acquire_timeout=timeout)
         for _ in range(10):  # Limit to 10 authors for simplicity
             try:
-                author = next(search_query)
+                author = scholar_call(next, search_query, acquire_timeout=timeout)
                 if author:
                     authors.append(process_author(author))
             except StopIteration:
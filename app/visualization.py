@@ -6,85 +6,109 @@ import pandas as pd
 import base64
 from io import BytesIO
 
+from plot_renderer import get_renderer
 
-def generate_percentile_rank_plot(dataframe, author_name):
-    try:
-        fig = Figure(figsize=(10, 10), dpi=100)
-        ax = fig.subplots(1, 1)  # Adjusted for better resolution
+# Applied per figure through matplotlib.rc_context; the global rcParams are never modified
+PLOT_RC_PARAMS = {"font.size": 16}
 
-        matplotlib.rcParams.update({"font.size": 16})
 
-        marker_size = 40
+def generate_percentile_rank_plot(dataframe, author_name):
+    columns = dataframe[["publication_rank", "num_citations_percentile", "age"]].to_dict("list")
+    return get_renderer().render(render_percentile_rank_plot, columns, author_name)
 
-        # First subplot (Rank vs Percentile Score)
-        scatter = ax.scatter(
-            dataframe["publication_rank"],
-            dataframe["num_citations_percentile"],
-            c=dataframe["age"],
-            cmap="Blues_r",
-            s=marker_size,
-        )
-        colorbar = fig.colorbar(scatter, ax=ax)
-        colorbar.set_label("Years since Publication")
-        ax.set_title(f"Paper Percentile Scores for {author_name}")
-        ax.set_yticks(np.arange(0, 110, step=10))  # Adjust step as needed
-        ax.grid(True, color="lightgray", linestyle="--")
-        ax.set_xlabel("Paper Rank")
-        ax.set_ylabel("Paper Percentile Score")
 
-        buf = BytesIO()
-        fig.tight_layout()
-        fig.savefig(buf, format="png")
-        data = base64.b64encode(buf.getbuffer()).decode("ascii")
+def generate_pip_plot(dataframe, author_name):
+    columns = dataframe[["num_papers_percentile", "num_citations_percentile", "age"]].to_dict("list")
+    return get_renderer().render(render_pip_plot, columns, author_name)
 
+
+def generate_pub_citation_plot(df):
+    try:
+        columns = df[["citation_year", "perc_yearly_citations", "perc_cumulative_citations", "yearly_citations"]]
+        return get_renderer().render(render_pub_citation_plot, columns.to_dict("list"))
     except Exception as e:
-        logging.error(f"Error in generate_plot for {author_name}: {e}")
-        raise
+        logging.error(f"Error generating publication citations plot: {e}")
+        return b""
 
-    return f"data:image/png;base64,{data}"
 
+# The render_* functions run in the worker processes of the PlotRenderer: they
+# take plain column data and return the PNG bytes.
 
-def generate_pip_plot(dataframe, author_name):
+
+def render_percentile_rank_plot(data, author_name):
     try:
-        fig = Figure(figsize=(10, 10), dpi=100)
-        ax = fig.subplots(1, 1)
+        with matplotlib.rc_context(PLOT_RC_PARAMS):
+            fig = Figure(figsize=(10, 10), dpi=100)
+            ax = fig.subplots(1, 1)  # Adjusted for better resolution
+
+            marker_size = 40
+
+            # First subplot (Rank vs Percentile Score)
+            scatter = ax.scatter(
+                data["publication_rank"],
+                data["num_citations_percentile"],
+                c=data["age"],
+                cmap="Blues_r",
+                s=marker_size,
+            )
+            colorbar = fig.colorbar(scatter, ax=ax)
+            colorbar.set_label("Years since Publication")
+            ax.set_title(f"Paper Percentile Scores for {author_name}")
+            ax.set_yticks(np.arange(0, 110, step=10))  # Adjust step as needed
+            ax.grid(True, color="lightgray", linestyle="--")
+            ax.set_xlabel("Paper Rank")
+            ax.set_ylabel("Paper Percentile Score")
+
+            buf = BytesIO()
+            fig.tight_layout()
+            fig.savefig(buf, format="png")
 
-        matplotlib.rcParams.update({"font.size": 16})
+    except Exception as e:
+        logging.error(f"Error in generate_plot for {author_name}: {e}")
+        raise
 
-        marker_size = 40
+    return buf.getvalue()
 
-        # Second subplot (Productivity Percentiles)
-        scatter = ax.scatter(
-            dataframe["num_papers_percentile"],
-            dataframe["num_citations_percentile"],
-            c=dataframe["age"],
-            cmap="Blues_r",
-            s=marker_size,
-        )
-        colorbar = fig.colorbar(scatter, ax=ax)
-        colorbar.set_label("Years since Publication")
-        ax.set_title(f"Paper Percentile Scores vs #Papers Percentile for {author_name}")
-        ax.set_xlabel("Number of Papers Published Percentile")
-        ax.set_ylabel("Paper Percentile Score")
-        ax.grid(True, color="lightgray", linestyle="--")
-        ax.set_xticks(np.arange(0, 110, step=10))  # Adjust step as needed
-        ax.set_yticks(np.arange(0, 110, step=10))  # Adjust step as needed
 
-        buf = BytesIO()
-        fig.tight_layout()
-        fig.savefig(buf, format="png")
-        data = base64.b64encode(buf.getbuffer()).decode("ascii")
+def render_pip_plot(data, author_name):
+    try:
+        with matplotlib.rc_context(PLOT_RC_PARAMS):
+            fig = Figure(figsize=(10, 10), dpi=100)
+            ax = fig.subplots(1, 1)
+
+            marker_size = 40
+
+            # Second subplot (Productivity Percentiles)
+            scatter = ax.scatter(
+                data["num_papers_percentile"],
+                data["num_citations_percentile"],
+                c=data["age"],
+                cmap="Blues_r",
+                s=marker_size,
+            )
+            colorbar = fig.colorbar(scatter, ax=ax)
+            colorbar.set_label("Years since Publication")
+            ax.set_title(f"Paper Percentile Scores vs #Papers Percentile for {author_name}")
+            ax.set_xlabel("Number of Papers Published Percentile")
+            ax.set_ylabel("Paper Percentile Score")
+            ax.grid(True, color="lightgray", linestyle="--")
+            ax.set_xticks(np.arange(0, 110, step=10))  # Adjust step as needed
+            ax.set_yticks(np.arange(0, 110, step=10))  # Adjust step as needed
+
+            buf = BytesIO()
+            fig.tight_layout()
+            fig.savefig(buf, format="png")
 
     except Exception as e:
         logging.error(f"Error in generate_plot for {author_name}: {e}")
         raise
 
-    return f"data:image/png;base64,{data}"
+    return buf.getvalue()
 
 
-def generate_pub_citation_plot(df):
+def render_pub_citation_plot(data):
     try:
-
+        df = pd.DataFrame(data)
         df["citation_year"] = pd.to_datetime(df["citation_year"], format="%Y")
 
         corrected_df = (
@@ -93,53 +117,52 @@ def generate_pub_citation_plot(df):
             .filter(["perc_yearly_citations", "perc_cumulative_citations", "yearly_citations"])
         )
 
-        fig = Figure(figsize=(10, 5), dpi=100)
-        ax1 = fig.subplots(1, 1)  # Adjusted for better resolution
-        matplotlib.rcParams.update({"font.size": 16})
-        # Plotting yearly_citations as a bar plot
-        color = "tab:blue"
-        ax1.set_xlabel("Citation Year")
-        ax1.set_ylabel("Yearly Citations", color=color)
-        ax1.bar(corrected_df.index, corrected_df["yearly_citations"], color=color, width=200)
-        ax1.tick_params(axis="y", labelcolor=color)
-        ax1.grid(which="major", linestyle="--", linewidth="0.5", color="gray")  # Gray dotted grid
-
-        # Secondary y-axis
-        ax2 = ax1.twinx()
-        color = "tab:red"
-        ax2.set_ylabel("% Citations", color=color)
-        ax2.plot(
-            corrected_df.index,
-            corrected_df["perc_yearly_citations"],
-            color="tab:orange",
-            label="Yearly Citations Percentile",
-            marker="o",
-        )
-        ax2.plot(
-            corrected_df.index,
-            corrected_df["perc_cumulative_citations"],
-            color="tab:red",
-            label="Cumulative Citations Percentile",
-            marker="o",
-        )
-        ax2.tick_params(axis="y", labelcolor=color)
-        ax2.set_ylim(0, 1)
-
-        # Merge legends
-        lines, labels = ax1.get_legend_handles_labels()
-        lines2, labels2 = ax2.get_legend_handles_labels()
-        ax2.legend(lines + lines2, labels + labels2, loc="lower left", bbox_to_anchor=(0, 1))
-
-        fig.suptitle("Citations over time")
-        fig.tight_layout()
-        buf = BytesIO()
-        fig.savefig(buf, format="png")
-        data = base64.b64encode(buf.getbuffer()).decode("ascii")
+        with matplotlib.rc_context(PLOT_RC_PARAMS):
+            fig = Figure(figsize=(10, 5), dpi=100)
+            ax1 = fig.subplots(1, 1)  # Adjusted for better resolution
+            # Plotting yearly_citations as a bar plot
+            color = "tab:blue"
+            ax1.set_xlabel("Citation Year")
+            ax1.set_ylabel("Yearly Citations", color=color)
+            ax1.bar(corrected_df.index, corrected_df["yearly_citations"], color=color, width=200)
+            ax1.tick_params(axis="y", labelcolor=color)
+            ax1.grid(which="major", linestyle="--", linewidth="0.5", color="gray")  # Gray dotted grid
+
+            # Secondary y-axis
+            ax2 = ax1.twinx()
+            color = "tab:red"
+            ax2.set_ylabel("% Citations", color=color)
+            ax2.plot(
+                corrected_df.index,
+                corrected_df["perc_yearly_citations"],
+                color="tab:orange",
+                label="Yearly Citations Percentile",
+                marker="o",
+            )
+            ax2.plot(
+                corrected_df.index,
+                corrected_df["perc_cumulative_citations"],
+                color="tab:red",
+                label="Cumulative Citations Percentile",
+                marker="o",
+            )
+            ax2.tick_params(axis="y", labelcolor=color)
+            ax2.set_ylim(0, 1)
+
+            # Merge legends
+            lines, labels = ax1.get_legend_handles_labels()
+            lines2, labels2 = ax2.get_legend_handles_labels()
+            ax2.legend(lines + lines2, labels + labels2, loc="lower left", bbox_to_anchor=(0, 1))
+
+            fig.suptitle("Citations over time")
+            fig.tight_layout()
+            buf = BytesIO()
+            fig.savefig(buf, format="png")
 
     except Exception as e:
         logging.error(f"Error generating publication citations plot: {e}")
-        return ""
-    return f"data:image/png;base64,{data}"
+        return b""
+    return buf.getvalue()
 
 
 def generate_citations_over_time_plot(dataframe, publication_title):
@@ -0,0 +1,123 @@
+"""
+Memory and latency of the BigQueryService result paths on a synthetic result set.
+
+Drives BigQueryService.query() with each result_format, and stream(), against a
+stubbed client whose query jobs return a google.cloud.bigquery RowIterator that
+yields the synthetic result as Arrow record batches (what the BigQuery Storage
+Read API delivers). Only the download is stubbed: the library's own to_arrow()
+and to_dataframe() conversions run as in production. The legacy path is
+query(result_format="dataframe") followed by to_dict("records").
+
+Run from the repository root:
+    python -m benchmarks.bench_bigquery_results [num_rows]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pyarrow as pa
+from google.cloud.bigquery.table import RowIterator
+
+from shared.services.bigquery_service import BigQueryService
+
+# Rows per record batch, in the range of what a Storage Read API stream returns
+BATCH_ROWS = 10_000
+
+
+def synthetic_author_pub_stats(num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pa.table(
+        {
+            "scholar_id": pa.array([f"author{i % 1000:06d}" for i in range(num_rows)]),
+            "author_pub_id": pa.array([f"author{i % 1000:06d}:pub{i:08d}" for i in range(num_rows)]),
+            "title": pa.array([f"A study of topic number {i}" for i in range(num_rows)]),
+            "citation": pa.array([f"Journal of Results {i % 97}, {i % 13}({i % 7})" for i in range(num_rows)]),
+            "pub_year": pa.array(rng.integers(1970, 2025, num_rows)),
+            "num_citations": pa.array(rng.integers(0, 5000, num_rows)),
+            "num_citations_percentile": pa.array(rng.random(num_rows)),
+            "publication_rank": pa.array(rng.integers(1, 1000, num_rows)),
+            "num_papers_percentile": pa.array(rng.random(num_rows)),
+        }
+    )
+
+
+class StubRowIterator(RowIterator):
+    """A RowIterator whose download yields the batches of an in-memory Arrow table."""
+
+    def __init__(self, table):
+        super().__init__(client=None, api_request=None, path=None, schema=[], total_rows=table.num_rows)
+        self._arrow_table = table
+
+    def _should_use_bqstorage(self, bqstorage_client, create_bqstorage_client, selected_fields=None):
+        return True
+
+    def to_arrow_iterable(self, bqstorage_client=None, max_queue_size=None, max_stream_count=None, timeout=None):
+        yield from self._arrow_table.to_batches(max_chunksize=BATCH_ROWS)
+
+
+class StubJob:
+    def __init__(self, table):
+        self.table = table
+
+    def result(self):
+        return StubRowIterator(self.table)
+
+
+class StubClient:
+    def __init__(self, table):
+        self.table = table
+
+    def query(self, sql, job_config=None):
+        return StubJob(self.table)
+
+
+def stub_service(table):
+    service = object.__new__(BigQueryService)
+    service.client = StubClient(table)
+    service._bqstorage_client = object()  # never called: the download is stubbed
+    return service
+
+
+def stream_rows(service):
+    # Consumers such as the all-authors export handle one batch at a time
+    return sum(batch.num_rows for batch in service.stream("SELECT 1"))
+
+
+PATHS = {
+    "dataframe records (legacy)": lambda service: service.query("SELECT 1").to_dict("records"),
+    'result_format="dataframe"': lambda service: service.query("SELECT 1", result_format="dataframe"),
+    'result_format="records"': lambda service: service.query("SELECT 1", result_format="records"),
+    'result_format="columns"': lambda service: service.query("SELECT 1", result_format="columns"),
+    "stream()": stream_rows,
+}
+
+
+def measure(run, service):
+    """Seconds, peak Python heap and Arrow memory held by the result (tracemalloc does not see Arrow's pool)."""
+    arrow_before = pa.total_allocated_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = run(service)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow = pa.total_allocated_bytes() - arrow_before
+    del result
+    return elapsed, peak, arrow
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    table = synthetic_author_pub_stats(num_rows)
+    service = stub_service(table)
+    print(f"{num_rows} rows, {table.nbytes / 2**20:.1f} MiB as Arrow")
+    print(f"{'path':<28} {'seconds':>9} {'peak MiB':>10} {'Arrow MiB':>10}")
+    for name, run in PATHS.items():
+        measure(run, service)  # warm up
+        elapsed, peak, arrow = measure(run, service)
+        print(f"{name:<28} {elapsed:>9.3f} {peak / 2**20:>10.1f} {arrow / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Serialization of scholarly authors for storage: legacy vs single-pass serializer.
+
+The legacy path (search_author_id.serialize_author before this change) deep-copied
+the author, projected its publications, round-tripped it through JSON and then
+walked it again to stringify large integers. The current path is
+shared.utils.serialize_for_storage with the publication projection applied while
+walking. Synthetic authors mimic scholarly's filled author objects.
+
+Run from the repository root:
+    python -m benchmarks.bench_serializer
+"""
+import copy
+import json
+import random
+import time
+import tracemalloc
+
+from shared.utils import convert_integers_to_strings, serialize_for_storage
+from functions.search_author_id.main import project_publications
+
+
+def synthetic_author(num_pubs, seed=0):
+    rng = random.Random(seed)
+    publications = [
+        {
+            "container_type": "Publication",
+            "source": "AUTHOR_PUBLICATION_ENTRY",
+            "bib": {
+                "title": f"A study of topic {i} " * 3,
+                "pub_year": str(rng.randint(1990, 2024)),
+                "citation": f"Journal of Things {rng.randint(1, 50)}, {rng.randint(1, 999)}-{rng.randint(1, 999)}",
+            },
+            "filled": False,
+            "author_pub_id": f"AUTHOR:pub{i}",
+            "num_citations": rng.randint(0, 5000),
+            "citedby_url": f"/scholar?oi=bibs&hl=en&cites={rng.getrandbits(64)}",
+            "cites_id": [str(rng.getrandbits(64))],
+            "public_access": rng.random() < 0.5,
+        }
+        for i in range(num_pubs)
+    ]
+    return {
+        "container_type": "Author",
+        "filled": ["basics", "indices", "counts", "coauthors", "publications"],
+        "scholar_id": "AUTHOR",
+        "source": "AUTHOR_PROFILE_PAGE",
+        "name": "Synthetic Author",
+        "affiliation": "University of Benchmarks",
+        "interests": ["serialization", "benchmarks"],
+        "citedby": 123456,
+        "citedby5y": 65432,
+        "hindex": 99,
+        "i10index": 300,
+        "cites_per_year": {year: rng.randint(0, 10000) for year in range(1990, 2025)},
+        "coauthors": [{"scholar_id": f"CO{i}", "name": f"Coauthor {i}", "filled": []} for i in range(50)],
+        "big_counter": 2**63 + 1,
+        "publications": publications,
+    }
+
+
+def legacy_serialize(author):
+    author = copy.deepcopy(author)
+    author["publications"] = project_publications(author.get("publications", []))
+    return convert_integers_to_strings(json.loads(json.dumps(author)))
+
+
+def current_serialize(author):
+    return serialize_for_storage(author, replace={"publications": project_publications})
+
+
+def measure(fn, author, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(author)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(author)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    print(f"{'publications':>12} | {'legacy ms':>9} {'peak KiB':>9} | {'current ms':>10} {'peak KiB':>9} | {'speedup':>7}")
+    for num_pubs in (100, 1000, 5000, 20000):
+        author = synthetic_author(num_pubs)
+        assert legacy_serialize(author) == current_serialize(author)
+        legacy_s, legacy_peak = measure(legacy_serialize, author)
+        current_s, current_peak = measure(current_serialize, author)
+        print(
+            f"{num_pubs:>12} | {legacy_s * 1000:>9.1f} {legacy_peak / 1024:>9.0f} | "
+            f"{current_s * 1000:>10.1f} {current_peak / 1024:>9.0f} | {legacy_s / current_s:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Cold-start cost of the Flask app: import time of main.py and latency of the
+first request, each measured in a fresh interpreter.
+
+Also lists the slowest imports reported by `python -X importtime`, so that a
+module that starts importing a heavy dependency at load time shows up here.
+That run only imports main.py, so the plot workers (which deliberately import
+matplotlib) are not started.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, "app")
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import main
+main.start_background_services()
+imported = time.perf_counter()
+response = main.app.test_client().get("/")
+first_request = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "first_request_s": first_request - imported,
+    "status": response.status_code,
+}))
+"""
+
+
+def environment(**overrides):
+    env = dict(os.environ, **overrides)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env["PLOT_RENDER_WORKERS"] = env.get("PLOT_RENDER_WORKERS", "1")
+    return env
+
+
+def measure_once():
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        cwd=APP_DIR,
+        env=environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(limit=10):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=APP_DIR,
+        env=environment(),
+        capture_output=True,
+        text=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <module>"
+        _, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = [measure_once() for _ in range(runs)]
+    for key in ("import_s", "first_request_s"):
+        values = [result[key] for result in results]
+        print(f"{key:<16} median {statistics.median(values):.3f}s  max {max(values):.3f}s  ({runs} runs)")
+
+    print("\nSlowest imports (cumulative):")
+    for cumulative_us, name in slowest_imports():
+        print(f"  {cumulative_us / 1e6:>7.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Enqueue cost of TaskQueueService against queues of increasing depth.
+
+Uses an in-memory stand-in for the Cloud Tasks client that counts API calls
+(create_task calls and list_tasks pages). The legacy strategy listed the whole
+queue before every enqueue; the current one relies on deterministic task names.
+
+Run from the repository root:
+    python -m benchmarks.bench_task_dedup
+"""
+import time
+from types import SimpleNamespace
+
+from google.api_core import exceptions
+from google.cloud import tasks_v2
+
+from shared.services.task_queue_service import TaskQueueService
+
+PAGE_SIZE = 1000  # Cloud Tasks list_tasks page size
+
+
+class FakeTasksClient:
+    queue_path = staticmethod(tasks_v2.CloudTasksClient.queue_path)
+
+    def __init__(self):
+        self.queues = {}
+        self.api_calls = 0
+
+    def fill(self, queue, depth):
+        self.queues[queue] = {f"{queue}/tasks/existing-{i}" for i in range(depth)}
+
+    def list_tasks(self, request):
+        names = list(self.queues.get(request["parent"], ()))
+        self.api_calls += max(1, -(-len(names) // PAGE_SIZE))
+        for name in names:
+            yield SimpleNamespace(name=name)
+
+    def create_task(self, request):
+        self.api_calls += 1
+        queue = self.queues.setdefault(request["parent"], set())
+        name = request["task"]["name"]
+        if name in queue:
+            raise exceptions.AlreadyExists(name)
+        queue.add(name)
+        return SimpleNamespace(name=name)
+
+
+def legacy_enqueue(service, task, queue):
+    for existing in service.tasks_client.list_tasks(request={"parent": queue}):
+        if existing.name == task["name"]:
+            return None
+    return service.tasks_client.create_task(request={"parent": queue, "task": task})
+
+
+def run(depth, num_pubs=100):
+    results = {}
+    for strategy in ("legacy", "current"):
+        client = FakeTasksClient()
+        service = TaskQueueService(tasks_client=client)
+        client.fill(service.pubs_queue, depth)
+        pubs = [{"author_pub_id": f"AUTHOR:pub{i}"} for i in range(num_pubs)]
+
+        start = time.perf_counter()
+        # Enqueue every publication twice to exercise de-duplication as well
+        for pub in pubs + pubs:
+            if strategy == "legacy":
+                task_id = pub["author_pub_id"].replace(":", "__")
+                task = service._create_http_task(f"{service.pubs_queue}/tasks/{task_id}", "http://localhost", "{}")
+                legacy_enqueue(service, task, service.pubs_queue)
+            else:
+                service.enqueue_publication_task(pub)
+        elapsed = time.perf_counter() - start
+        results[strategy] = (client.api_calls, elapsed)
+    return results
+
+
+def main():
+    print(f"{'queue depth':>12} | {'legacy calls':>12} {'legacy s':>9} | {'current calls':>13} {'current s':>9}")
+    for depth in (0, 1000, 10000, 25000):
+        results = run(depth)
+        legacy_calls, legacy_s = results["legacy"]
+        current_calls, current_s = results["current"]
+        print(f"{depth:>12} | {legacy_calls:>12} {legacy_s:>9.3f} | {current_calls:>13} {current_s:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,29 @@
 import functions_framework
-import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from flask import jsonify
 
-from scholarly import scholarly
-from scholarly.data_types import PublicationSource
-
 from shared.config import Config
-from shared.utils import convert_integers_to_strings
-from shared.services.firestore_service import FirestoreService
+from shared.utils import serialize_for_storage
+from shared.rate_limit import scholar_call, ScholarUnavailable
+from shared.registry import get_author_repository, get_publication_repository, get_task_queue_service
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 
-# Instantiate services
-firestore_service = FirestoreService()
+# Services are created on first use (see shared.registry) and reused across invocations
 
 
 @functions_framework.http
 def fill_publication(request):
     """HTTP Cloud Function to fill publication details from Google Scholar and cache them."""
-    request_json = request.get_json(silent=True)
+    request_json = request.get_json(silent=True) or {}
+
+    # Chunk tasks enqueued by search_author_id carry a list of publications
+    pubs = request_json.get("pubs")
+    if pubs is not None:
+        return fill_publications(pubs)
 
     # Validate input
     pub = request_json.get("pub")
@@ -36,22 +39,99 @@ def fill_publication(request):
         return jsonify({"error": "Failed to process publication"}), 500
 
 
-def process_publication(pub):
-    """Fetches, serializes, and caches publication details."""
-    author_pub_id = pub["author_pub_id"]
-    logging.info(f"Fetching publication details for {author_pub_id}")
+def fill_publications(pubs):
+    """Fills a chunk of publications concurrently and caches them with a single batched write.
+
+    Publications that fail are re-enqueued as individual tasks, so that Cloud Tasks
+    retries them one by one instead of retrying the whole chunk. If Google Scholar is
+    unavailable (circuit open or no token), the chunk fails with 503 instead, and is
+    retried as a whole with the queue's backoff.
+    Returns:
+        flask.Response: The status of each publication.
+    """
+    if not isinstance(pubs, list) or not all(isinstance(pub, dict) and "author_pub_id" in pub for pub in pubs):
+        logging.error("Invalid publication data provided.")
+        return jsonify({"error": "Missing or invalid 'pubs' data"}), 400
+
+    # Once Scholar is unavailable, the rest of the chunk is not attempted
+    unavailable = threading.Event()
+
+    def fill(pub):
+        if unavailable.is_set():
+            return None, ScholarUnavailable("Google Scholar is unavailable")
+        try:
+            return fetch_publication(pub), None
+        except ScholarUnavailable as e:
+            unavailable.set()
+            logging.warning(f"Not filling publication {pub['author_pub_id']}: {e}")
+            return None, e
+        except Exception as e:
+            logging.error(f"Failed to fill publication {pub['author_pub_id']}: {e}")
+            return None, e
+
+    results = {pub["author_pub_id"]: {"author_pub_id": pub["author_pub_id"], "status": "ok"} for pub in pubs}
+    filled_pubs = {}
+    max_workers = max(1, min(Config.FILL_PUBLICATION_MAX_WORKERS, len(pubs)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for pub, (serialized_pub, error) in zip(pubs, executor.map(fill, pubs)):
+            if error is None:
+                filled_pubs[pub["author_pub_id"]] = serialized_pub
+            else:
+                results[pub["author_pub_id"]].update(status="error", error=str(error))
+
+    for author_pub_id in get_publication_repository().save_publications(filled_pubs):
+        results[author_pub_id].update(status="error", error="Failed to store publication")
+
+    # Advance the last-modified watermark once per author with stored publications
+    stored = [author_pub_id for author_pub_id, result in results.items() if result["status"] == "ok"]
+    for author_id in {author_pub_id.split(":")[0] for author_pub_id in stored}:
+        get_author_repository().touch_last_modification(author_id)
+
+    if unavailable.is_set():
+        return jsonify({"results": list(results.values())}), 503
+
+    # Retry failed publications individually; if that is not possible, fail the whole chunk.
+    # A duplicate task means the publication is already requeued (e.g. on a redelivery of the chunk).
+    status_code = 200
+    for pub in pubs:
+        result = results[pub["author_pub_id"]]
+        if result["status"] == "error":
+            try:
+                get_task_queue_service().create_publication_task(pub)
+                result["requeued"] = True
+            except Exception as e:
+                logging.error(f"Failed to requeue publication {pub['author_pub_id']}: {e}")
+                result["requeued"] = False
+                status_code = 500
+
+    return jsonify({"results": list(results.values())}), status_code
+
+
+def fetch_publication(pub):
+    """Fetches publication details from Google Scholar and serializes them for storage."""
+    from scholarly import scholarly  # slow to import, so only loaded when needed
+    from scholarly.data_types import PublicationSource
+
+    logging.info(f"Fetching publication details for {pub['author_pub_id']}")
 
     pub["source"] = PublicationSource.AUTHOR_PUBLICATION_ENTRY
     pub["container_type"] = "Publication"
 
-    # Fetch publication details
-    detailed_pub = scholarly.fill(pub)
+    # Fetch publication details, through the rate limiter shared by all instances
+    detailed_pub = scholar_call(scholarly.fill, pub)
 
-    # Convert large integers to strings to avoid serialization issues
-    serialized_pub = convert_integers_to_strings(json.loads(json.dumps(detailed_pub)))
+    # Convert to plain data for Firestore, with large integers as strings
+    return serialize_for_storage(detailed_pub)
+
+
+def process_publication(pub):
+    """Fetches, serializes, and caches publication details."""
+    author_pub_id = pub["author_pub_id"]
+    serialized_pub = fetch_publication(pub)
 
-    # Cache publication details
-    firestore_service.set_firestore_cache(Config.FIRESTORE_COLLECTION_PUB, author_pub_id, serialized_pub)
+    # Cache publication details and advance the author's last-modified watermark
+    if get_publication_repository().save_publication(author_pub_id, serialized_pub):
+        get_author_repository().touch_last_modification(author_pub_id.split(":")[0])
 
     logging.info(f"Publication details for {author_pub_id} have been updated and cached.")
     return serialized_pub
@@ -1,27 +1,16 @@
 import functions_framework
-import json
 import logging
-import copy
-import time
 from flask import jsonify
-from scholarly import scholarly
 
 
-from shared.utils import convert_integers_to_strings
-from shared.services.firestore_service import FirestoreService
-from shared.services.task_queue_service import TaskQueueService
-from shared.repositories.author_repository import AuthorRepository
-from shared.repositories.publication_repository import PublicationRepository
+from shared.utils import serialize_for_storage
+from shared.rate_limit import scholar_call
+from shared.registry import get_author_repository, get_publication_repository, get_task_queue_service
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 
-# Instantiate services
-firestore_service = FirestoreService()
-task_queue_service = TaskQueueService()
-
-publication_repository = PublicationRepository(firestore_service)
-author_repository = AuthorRepository(firestore_service, publication_repository)
+# Services are created on first use (see shared.registry) and reused across invocations
 
 
 @functions_framework.http
@@ -34,23 +23,26 @@ def search_author_id(request):
     """
     scholar_id = request.args.get("scholar_id") or (request.get_json(silent=True) or {}).get("scholar_id")
     skip_pubs = request.args.get("skip_pubs") or (request.get_json(silent=True) or {}).get("skip_pubs")
+    full_refresh = request.args.get("full_refresh") or (request.get_json(silent=True) or {}).get("full_refresh")
 
     if not scholar_id:
         return jsonify({"error": "Missing author id"}), 400
 
-    author_info = process_author(scholar_id, skip_pubs)
+    author_info = process_author(scholar_id, skip_pubs, full_refresh=bool(full_refresh))
     if author_info is None:
         return jsonify({"error": "Failed to fetch or process author data"}), 500
 
     return jsonify(author_info), 200
 
 
-def process_author(scholar_id, skip_pubs=None):
+def process_author(scholar_id, skip_pubs=None, full_refresh=False):
     """Fetches and processes an author's information and publications.
     Args:
         scholar_id (str): Google Scholar ID of the author.
+        full_refresh (bool): Re-fill every publication, not only the new or changed ones.
     Returns:
-        dict: Serialized author information, or None upon failure.
+        dict: Serialized author information (with a "publications_refresh" report
+              when publications were processed), or None upon failure.
     """
     author = fetch_author(scholar_id)
     if author is None:
@@ -61,16 +53,32 @@ def process_author(scholar_id, skip_pubs=None):
         logging.error(f"Failed to serialize author {scholar_id}e.")
         return None
 
+    author_repository = get_author_repository()
+    previous_author = None
+    if not full_refresh:
+        try:
+            previous_author = author_repository.get_author(scholar_id)
+        except Exception as e:
+            # Without the stored copy every publication is refilled
+            logging.error(f"Error reading the stored author {scholar_id}: {e}")
     success = author_repository.save_author(scholar_id, serialized_author)
 
     if not success:
         logging.error(f"Failed to store author {scholar_id} in Firestore.")
         return None
 
-    # TODO: When the number of publications are large, the app
-    # does not work well. We should consider refactoring this.
+    author_repository.touch_last_modification(scholar_id)
+
     if skip_pubs is None:
-        enqueue_publications(author.get("publications", []))
+        publications = author.get("publications", [])
+        if not full_refresh:
+            publications = changed_publications(publications, previous_author)
+        report = enqueue_publications(publications)
+        report["skipped"] = len(author.get("publications", [])) - len(publications)
+        logging.info(
+            f"Refresh of {scholar_id}: {len(publications)} publications to fill, {report['skipped']} unchanged."
+        )
+        return {**serialized_author, "publications_refresh": report}
 
     return serialized_author
 
@@ -84,21 +92,89 @@ def fetch_author(scholar_id):
     """
     try:
         logging.info(f"Fetching author entry from Google Scholar for {scholar_id}")
-        return scholarly.fill(scholarly.search_author_id(scholar_id))
+        from scholarly import scholarly  # slow to import, so only loaded when needed
+
+        # Both requests go through the rate limiter shared by all instances
+        return scholar_call(scholarly.fill, scholar_call(scholarly.search_author_id, scholar_id))
     except Exception as e:
         logging.error(f"Error fetching author data from Google Scholar for {scholar_id}: {e}")
         return None
 
 
+# Fields of a publication's search listing that are also stored in its filled document
+BIB_FIELDS = ["title", "pub_year", "citation"]
+
+
+def publication_changed(pub, stored):
+    """Whether the listing `pub` differs from the stored (filled or author-level) entry."""
+    if str(pub.get("num_citations", 0)) != str(stored.get("num_citations", 0)):
+        return True
+    bib, stored_bib = pub.get("bib", {}), stored.get("bib", {})
+    return any(str(bib[key]) != str(stored_bib.get(key)) for key in BIB_FIELDS if key in bib and key in stored_bib)
+
+
+def changed_publications(publications, previous_author):
+    """Returns the publications that are new or changed since they were last filled.
+    Args:
+        publications (list): The publication listings of the freshly fetched author.
+        previous_author (dict): The previously stored author, or None.
+    Returns:
+        list: The publications that need to be filled again.
+    """
+    previous = {pub.get("author_pub_id"): pub for pub in (previous_author or {}).get("publications", [])}
+
+    # Publications that changed since the previous refresh need no further check;
+    # the others are compared with their filled documents, read in one batch.
+    changed, to_check = [], []
+    for pub in publications:
+        author_pub_id = pub.get("author_pub_id")
+        if not author_pub_id:
+            continue
+        stored = previous.get(author_pub_id)
+        if stored is not None and publication_changed(pub, stored):
+            changed.append(pub)
+        else:
+            to_check.append(pub)
+
+    stored_pubs = get_publication_repository().get_publications([pub["author_pub_id"] for pub in to_check])
+    for pub in to_check:
+        stored = stored_pubs.get(pub["author_pub_id"])
+        if stored is None or publication_changed(pub, stored):
+            changed.append(pub)
+    return changed
+
+
 def enqueue_publications(publications):
-    """Enqueues tasks for processing each publication.
+    """Enqueues tasks for processing the publications, in chunks of Config.PUBS_PER_TASK.
     Args:
         publications (list): A list of publication data dictionaries.
+    Returns:
+        dict: Number of chunk tasks enqueued and skipped as duplicates, and the failed publication ids.
     """
-    for pub in publications:
-        time.sleep(0.1)  # avoid overloading the queue service
-        if not task_queue_service.enqueue_publication_task(pub):
-            logging.error(f"Failed to enqueue publication task for {pub.get('author_pub_id')}")
+    report = get_task_queue_service().enqueue_publication_tasks(publications)
+    logging.info(
+        f"Enqueued {report['enqueued']} publication chunks "
+        f"({report['duplicates']} already queued, {len(report['failed'])} publications failed)."
+    )
+    for author_pub_id in report["failed"]:
+        logging.error(f"Failed to enqueue publication task for {author_pub_id}")
+    return report
+
+
+def project_publications(publications):
+    """Keeps the publication fields stored with the author; the rest is filled by fill_publication."""
+    return [
+        {
+            "author_pub_id": pub.get("author_pub_id"),
+            "num_citations": pub.get("num_citations", 0),
+            "filled": False,
+            "bib": {key: pub["bib"][key] for key in ["pub_year"] if key in pub.get("bib", {})},
+            # "source" : pub.get("source"),
+            # "container_type" : pub.get("container_type")
+        }
+        for pub in publications
+        if pub.get("author_pub_id")
+    ]
 
 
 def serialize_author(author):
@@ -109,21 +185,8 @@ def serialize_author(author):
         dict: The serialized author data.
     """
     try:
-        author = copy.deepcopy(author)
-        author["publications"] = [
-            {
-                "author_pub_id": pub.get("author_pub_id"),
-                "num_citations": pub.get("num_citations", 0),
-                "filled": False,
-                "bib": {key: pub["bib"][key] for key in ["pub_year"] if key in pub.get("bib", {})},
-                # "source" : pub.get("source"),
-                # "container_type" : pub.get("container_type")
-            }
-            for pub in author.get("publications", [])
-            if pub.get("author_pub_id")
-        ]
-        serialized = convert_integers_to_strings(json.loads(json.dumps(author)))  # Simplified serialization
-        return serialized
+        # Single pass over the author, projecting the publications on the way
+        return serialize_for_storage(author, replace={"publications": project_publications})
     except Exception as e:
         logging.error(f"Error serializing author data: {e}")
         return None
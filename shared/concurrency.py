@@ -0,0 +1,43 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from .config import Config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_io_executor():
+    """
+    Return the process-wide thread pool for blocking backend calls (Firestore,
+    BigQuery, Cloud Tasks).
+
+    Only submit leaf I/O calls to it: a task that waits on other tasks of the
+    same pool can exhaust it and deadlock.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.IO_POOL_WORKERS, thread_name_prefix="io")
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    return get_io_executor().submit(fn, *args, **kwargs)
+
+
+def result_or_default(future, timeout, default=None, description="backend call"):
+    """
+    Wait up to `timeout` seconds for a future, returning `default` if it times out or fails.
+
+    Used for calls the caller can do without, e.g. rendering a page without the queue depth.
+    """
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        logging.warning(f"Timed out after {timeout}s waiting for {description}; continuing without it.")
+    except Exception as e:
+        logging.error(f"Error in {description}: {e}")
+    return default
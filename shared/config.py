@@ -15,8 +15,85 @@ class Config:
         f"projects/{PROJECT_ID}/locations/{QUEUE_LOCATION}/queues/{QUEUE_NAME_PUBS}"
     )
 
+    # Seconds a task name is remembered locally after it was enqueued
+    TASK_DEDUP_TTL = 600
+    # Maximum age in seconds of the queue depth / pending-author snapshot
+    QUEUE_STATE_MAX_STALENESS = 15
+    # Bulk publication enqueue: publications per fill_publication task (capped below,
+    # see FILL_PUBLICATION_TIMEOUT), parallel create_task calls, and retries (with
+    # exponential backoff) when throttled
+    PUBS_PER_TASK = int(os.getenv("PUBS_PER_TASK", "20"))
+    ENQUEUE_MAX_WORKERS = 8
+    ENQUEUE_MAX_RETRIES = 5
+    # Author documents read per Firestore batch when refreshing authors
+    REFRESH_BATCH_SIZE = 100
+    # Concurrent scholarly.fill calls when fill_publication receives a chunk
+    FILL_PUBLICATION_MAX_WORKERS = int(os.getenv("FILL_PUBLICATION_MAX_WORKERS", "4"))
+
+    # Shared thread pool for concurrent backend calls, and deadlines (seconds)
+    # for the calls a page can be rendered without
+    IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "32"))
+    PENDING_TASKS_DEADLINE = 2.0
+    QUEUE_DEPTH_DEADLINE = 1.0
+
+    # Cached stats that are behind the author's last modification are served
+    # while being recomputed, unless they are more than this many seconds behind
+    STATS_MAX_STALENESS = int(os.getenv("STATS_MAX_STALENESS", str(3 * 24 * 3600)))
+
     FIRESTORE_COLLECTION_AUTHOR = "scholar_raw_author"
     FIRESTORE_COLLECTION_PUB = "scholar_raw_pub"
+    FIRESTORE_COLLECTION_AUTHOR_WATERMARK = "author_last_modified"
+    FIRESTORE_COLLECTION_AUTHOR_VIEWS = "author_views"
+    # Authors with more publications than this are stored as a header document plus
+    # shards of AUTHOR_PUBLICATIONS_PER_SHARD publications in a subcollection
+    FIRESTORE_SUBCOLLECTION_PUBLICATION_SHARDS = "publication_shards"
+    AUTHOR_INLINE_PUBLICATIONS_MAX = int(os.getenv("AUTHOR_INLINE_PUBLICATIONS_MAX", "1000"))
+    AUTHOR_PUBLICATIONS_PER_SHARD = 500
+    FIRESTORE_COLLECTION_RATE_LIMITS = "rate_limits"
+    FIRESTORE_COLLECTION_REFRESH_PLANNER = "refresh_planner"
+
+    # Google Scholar access (see shared/rate_limit.py). The token bucket is shared
+    # through Firestore ("firestore") or per process ("local"); its rate (requests
+    # per second) adapts between SCHOLAR_MIN_RATE and SCHOLAR_MAX_RATE. Instances
+    # lease SCHOLAR_TOKEN_LEASE tokens at a time from the shared bucket.
+    SCHOLAR_RATE_LIMITER = os.getenv("SCHOLAR_RATE_LIMITER", "firestore")
+    SCHOLAR_RATE = float(os.getenv("SCHOLAR_RATE", "0.5"))
+    SCHOLAR_MIN_RATE = 0.05
+    SCHOLAR_MAX_RATE = float(os.getenv("SCHOLAR_MAX_RATE", "2.0"))
+    SCHOLAR_RATE_STEP = 0.01
+    SCHOLAR_BURST = 5
+    SCHOLAR_TOKEN_LEASE = 2
+    SCHOLAR_ACQUIRE_TIMEOUT = 60
+    # Shorter wait for calls made while a user waits (similar-author search)
+    SCHOLAR_INTERACTIVE_ACQUIRE_TIMEOUT = 5
+    # Retries of a failed call, with exponential backoff from SCHOLAR_BACKOFF_BASE seconds
+    SCHOLAR_MAX_RETRIES = 2
+    SCHOLAR_BACKOFF_BASE = 2.0
+    # The circuit opens for SCHOLAR_BREAKER_OPEN_SECONDS when at least
+    # SCHOLAR_BREAKER_ERROR_RATE of the calls of the last SCHOLAR_BREAKER_WINDOW
+    # seconds failed (and there were at least SCHOLAR_BREAKER_MIN_CALLS)
+    SCHOLAR_BREAKER_ERROR_RATE = 0.5
+    SCHOLAR_BREAKER_MIN_CALLS = 5
+    SCHOLAR_BREAKER_WINDOW = 60
+    SCHOLAR_BREAKER_OPEN_SECONDS = 300
+    # Timeout in seconds of the fill_publication function (keep in sync with --timeout
+    # in .github/workflows/function.yml). A chunk takes a token per publication, so
+    # PUBS_PER_TASK is capped to what SCHOLAR_RATE yields in half of it, leaving the
+    # other half for retries and for the tokens taken by other instances.
+    FILL_PUBLICATION_TIMEOUT = 540
+    PUBS_PER_TASK = min(PUBS_PER_TASK, max(1, int(SCHOLAR_RATE * FILL_PUBLICATION_TIMEOUT / 2)))
+
+    # Refresh planning (see shared/refresh_planner.py): an author is due once the
+    # expected number of citations missing from its stored copy, weighted by
+    # 1 + REFRESH_VIEW_WEIGHT * (page views this and last month), reaches
+    # REFRESH_COST_THRESHOLD, but never before REFRESH_MIN_AGE_DAYS nor after
+    # REFRESH_MAX_AGE_DAYS. Planned authors are not planned again for
+    # REFRESH_RETRY_DELAY seconds. The schedule is kept in the author_views documents.
+    REFRESH_COST_THRESHOLD = 5.0
+    REFRESH_VIEW_WEIGHT = 0.1
+    REFRESH_MIN_AGE_DAYS = 7
+    REFRESH_MAX_AGE_DAYS = 90
+    REFRESH_RETRY_DELAY = 24 * 3600
 
     FUNCTION_LOCATION = "northamerica-northeast2"
     API_SEARCH_AUTHOR_ID = (
@@ -28,5 +105,56 @@ class Config:
 
     BUCKET_NAME = "scholar_data_share"
 
+    # Export of the stats of all authors: blobs in the bucket, upload chunk size
+    # (a multiple of 256 KiB), and seconds after which an export lock is abandoned
+    ALL_AUTHORS_STATS_CSV_BLOB = "all_authors_stats.csv"
+    ALL_AUTHORS_STATS_PARQUET_BLOB = "all_authors_stats.parquet"
+    ALL_AUTHORS_STATS_LOCK_BLOB = "locks/all_authors_stats.lock"
+    EXPORT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+    EXPORT_LOCK_TTL = 30 * 60
+
+    # Percentile tables produced by notebooks/Percentiles_for_Publications.ipynb
+    CITATION_PERCENTILES_CSV = os.getenv(
+        "CITATION_PERCENTILES_CSV", "https://raw.githubusercontent.com/ipeirotis/scholar_v2/main/percentiles.csv"
+    )
+    NUMPAPERS_PERCENTILES_CSV = os.getenv(
+        "NUMPAPERS_PERCENTILES_CSV",
+        "https://raw.githubusercontent.com/ipeirotis-org/scholar_v2/main/author_numpapers_percentiles.csv",
+    )
+
+    # Rendered plots: in-memory LRU budget, and optional persistence to the bucket
+    PLOT_CACHE_MAX_BYTES = int(os.getenv("PLOT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    PLOT_CACHE_PERSIST = os.getenv("PLOT_CACHE_PERSIST", "false").lower() == "true"
+    PLOT_CACHE_GCS_PREFIX = "plots"
+    # Worker processes used to render plots, and seconds to wait for a plot
+    PLOT_RENDER_WORKERS = int(os.getenv("PLOT_RENDER_WORKERS", str(os.cpu_count() or 1)))
+    PLOT_RENDER_TIMEOUT = 30
+    PLOT_RENDER_WARM_UP = os.getenv("PLOT_RENDER_WARM_UP", "true").lower() == "true"
+
+    # In-memory index of author names for /get_similar_authors: snapshot blob in
+    # the bucket (empty to disable), and seconds between incremental refreshes
+    # and between snapshot updates
+    AUTHOR_INDEX_SNAPSHOT_BLOB = os.getenv("AUTHOR_INDEX_SNAPSHOT_BLOB", "indexes/author_names.json.gz")
+    AUTHOR_INDEX_REFRESH_INTERVAL = 300
+    AUTHOR_INDEX_SNAPSHOT_INTERVAL = 3600
+    AUTHOR_INDEX_ENABLED = os.getenv("AUTHOR_INDEX_ENABLED", "true").lower() == "true"
+
+    # Streamed downloads: bytes per response chunk, and rows per Parquet row group
+    EXPORT_CHUNK_SIZE = 64 * 1024
+    EXPORT_PARQUET_BATCH_ROWS = 1000
+
     DOWNLOADS_DIR = os.getenv("DOWNLOADS_DIR", "downloads")
     STATIC_DIR = os.getenv("STATIC_DIR", "static")
+
+    # In-process read-through cache in front of Firestore (seconds per collection)
+    FIRESTORE_LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("FIRESTORE_LOCAL_CACHE_MAX_ENTRIES", "1024"))
+    FIRESTORE_LOCAL_CACHE_DEFAULT_TTL = 60
+    FIRESTORE_LOCAL_CACHE_TTLS = {
+        FIRESTORE_COLLECTION_AUTHOR: 60,
+        FIRESTORE_COLLECTION_PUB: 300,
+        FIRESTORE_COLLECTION_AUTHOR_WATERMARK: 30,
+        "author_pub_stats": 300,
+        "author_stats": 300,
+        "pub_stats": 300,
+        "queries": 3600,
+    }
@@ -0,0 +1,321 @@
+"""
+Coordinated access to Google Scholar.
+
+Every scholarly call goes through `scholar_call`, which
+- takes a token from a token bucket shared by all instances (kept in Firestore,
+  or in process with Config.SCHOLAR_RATE_LIMITER = "local"),
+- retries failed calls with exponential backoff and jitter,
+- stops dispatching for a while when the error rate spikes (circuit breaker),
+  pausing the shared bucket so that the other instances back off too.
+
+The bucket's rate adapts to what Scholar tolerates: it grows by a small step per
+successful call and is halved whenever the breaker opens.
+"""
+import inspect
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from .config import Config
+
+
+class ScholarUnavailable(Exception):
+    """Raised when a call is not dispatched: the circuit is open or no token became available."""
+
+
+class LocalTokenBucket:
+    """In-process token bucket; the stand-in for FirestoreTokenBucket."""
+
+    def __init__(self, rate=None, capacity=None, min_rate=None, max_rate=None):
+        self.rate = rate or Config.SCHOLAR_RATE
+        self.capacity = capacity or Config.SCHOLAR_BURST
+        self.min_rate = min_rate or Config.SCHOLAR_MIN_RATE
+        self.max_rate = max_rate or Config.SCHOLAR_MAX_RATE
+        self.tokens = self.capacity
+        self.paused_until = 0
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token; return 0 on success, or the seconds to wait before trying again."""
+        with self._lock:
+            now = time.time()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + Config.SCHOLAR_RATE_STEP)
+
+    def penalize(self, pause):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.paused_until = max(self.paused_until, time.time() + pause)
+
+
+class FirestoreTokenBucket:
+    """
+    Token bucket shared by all instances, stored in a Firestore document.
+
+    Tokens are leased `lease` at a time in a transaction and handed out locally, so
+    that the document sees one transaction per lease rather than one per call.
+    Rewards and penalties are accumulated locally and applied with the next lease.
+    """
+
+    def __init__(self, db, doc_id="scholar", lease=None):
+        self.db = db
+        self.doc_ref = db.collection(Config.FIRESTORE_COLLECTION_RATE_LIMITS).document(doc_id)
+        self.lease = lease or Config.SCHOLAR_TOKEN_LEASE
+        self._tokens = 0
+        self._rewards = 0
+        self._pause = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self._tokens > 0:
+                self._tokens -= 1
+                return 0
+            granted, wait = self._lease()
+            if granted:
+                self._tokens = granted - 1
+                return 0
+            return wait
+
+    def reward(self):
+        with self._lock:
+            self._rewards += 1
+
+    def penalize(self, pause):
+        with self._lock:
+            self._tokens = 0
+            self._pause = max(self._pause, pause)
+            # Apply the pause right away, so that the other instances stop too
+            self._lease(take=0)
+
+    def _lease(self, take=None):
+        from google.cloud import firestore
+
+        take = self.lease if take is None else take
+        rewards, pause = self._rewards, self._pause
+
+        @firestore.transactional
+        def lease(transaction):
+            snapshot = self.doc_ref.get(transaction=transaction)
+            state = snapshot.to_dict() if snapshot.exists else {}
+            now = time.time()
+            rate = state.get("rate", Config.SCHOLAR_RATE)
+            capacity = Config.SCHOLAR_BURST
+            paused_until = state.get("paused_until", 0)
+            tokens = state.get("tokens", capacity)
+            tokens = min(capacity, tokens + max(0, now - state.get("updated", now)) * rate)
+
+            rate = min(Config.SCHOLAR_MAX_RATE, rate + rewards * Config.SCHOLAR_RATE_STEP)
+            if pause:
+                rate = max(Config.SCHOLAR_MIN_RATE, rate / 2)
+                paused_until = max(paused_until, now + pause)
+
+            granted, wait = 0, 0
+            if now < paused_until:
+                wait = paused_until - now
+            elif tokens >= 1:
+                granted = min(take, int(tokens))
+                tokens -= granted
+            else:
+                wait = (1 - tokens) / rate
+
+            transaction.set(
+                self.doc_ref, {"rate": rate, "tokens": tokens, "updated": now, "paused_until": paused_until}
+            )
+            return granted, wait
+
+        granted, wait = lease(self.db.transaction())
+        self._rewards -= rewards
+        if pause:
+            self._pause = 0
+        return granted, wait
+
+
+class CircuitBreaker:
+    """
+    Opens when at least `error_rate` of the calls of the last `window` seconds failed
+    (given at least `min_calls` calls), and lets a single trial call through after
+    `open_seconds`; the circuit closes again if that call succeeds.
+    """
+
+    def __init__(self, error_rate=None, min_calls=None, window=None, open_seconds=None):
+        self.error_rate = error_rate or Config.SCHOLAR_BREAKER_ERROR_RATE
+        self.min_calls = min_calls or Config.SCHOLAR_BREAKER_MIN_CALLS
+        self.window = window or Config.SCHOLAR_BREAKER_WINDOW
+        self.open_seconds = open_seconds or Config.SCHOLAR_BREAKER_OPEN_SECONDS
+        self.opened_at = None
+        self._trial = False
+        self._calls = deque()  # (time, failed)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.open_seconds:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self):
+        """Give back the trial slot claimed by `allow` for a call that was not dispatched."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, failed):
+        """Record the outcome of a call; return True if it opened the circuit."""
+        with self._lock:
+            now = time.monotonic()
+            if self.opened_at is not None:
+                # Outcome of the trial call (or of calls dispatched before opening)
+                if self._trial:
+                    self._trial = False
+                    if failed:
+                        self.opened_at = now
+                        return True
+                    self.opened_at = None
+                    self._calls.clear()
+                return False
+
+            self._calls.append((now, failed))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            failures = sum(1 for _, call_failed in self._calls if call_failed)
+            if len(self._calls) >= self.min_calls and failures >= self.error_rate * len(self._calls):
+                self.opened_at = now
+                self._calls.clear()
+                logging.warning(f"Opening the Google Scholar circuit ({failures} recent failures)")
+                return True
+            return False
+
+
+class ScholarGuard:
+    """Dispatches calls to Google Scholar through a token bucket and a circuit breaker."""
+
+    def __init__(self, bucket, breaker=None, max_retries=None, acquire_timeout=None):
+        self.bucket = bucket
+        self.fallback_bucket = None
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = Config.SCHOLAR_MAX_RETRIES if max_retries is None else max_retries
+        self.acquire_timeout = Config.SCHOLAR_ACQUIRE_TIMEOUT if acquire_timeout is None else acquire_timeout
+
+    def _try_acquire(self):
+        try:
+            return self.bucket.try_acquire()
+        except Exception as e:
+            # Keep going at the local rate while the shared bucket is unreachable
+            logging.error(f"Error accessing the shared rate limit; using a local one: {e}")
+            if self.fallback_bucket is None:
+                self.fallback_bucket = LocalTokenBucket()
+            return self.fallback_bucket.try_acquire()
+
+    def acquire(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise ScholarUnavailable(f"No Google Scholar request slot within {timeout}s")
+            time.sleep(wait)
+
+    def call(self, fn, *args, acquire_timeout=None, **kwargs):
+        """
+        Call `fn(*args, **kwargs)` once a token is available, retrying failures with
+        exponential backoff. StopIteration is passed through as a normal outcome,
+        so that `call(next, iterator)` can page through scholarly's search results;
+        such a call is not retried if the iterator is a generator, as a generator
+        that raised is finished.
+
+        ScholarUnavailable is raised if the circuit is open, or if no token becomes
+        available within `acquire_timeout` seconds (Config.SCHOLAR_ACQUIRE_TIMEOUT).
+        """
+        max_retries = 0 if fn is next and args and inspect.isgenerator(args[0]) else self.max_retries
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise ScholarUnavailable("Google Scholar circuit is open")
+            try:
+                self.acquire(acquire_timeout)
+            except BaseException:
+                # The call is not dispatched: let another one be the trial call
+                self.breaker.release()
+                raise
+            try:
+                result = fn(*args, **kwargs)
+            except StopIteration:
+                self.breaker.record(failed=False)
+                raise
+            except Exception as e:
+                if self.breaker.record(failed=True):
+                    self._penalize()
+                if attempt >= max_retries:
+                    raise
+                delay = min(60, Config.SCHOLAR_BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1.5)
+                logging.warning(f"Google Scholar call failed ({e}); retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record(failed=False)
+            self._reward()
+            return result
+
+    def _reward(self):
+        try:
+            self.bucket.reward()
+        except Exception as e:
+            logging.error(f"Error updating the shared rate limit: {e}")
+
+    def _penalize(self):
+        try:
+            self.bucket.penalize(self.breaker.open_seconds)
+        except Exception as e:
+            logging.error(f"Error pausing the shared rate limit: {e}")
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_scholar_guard():
+    """Return the process-wide ScholarGuard."""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                if Config.SCHOLAR_RATE_LIMITER == "firestore":
+                    from .registry import get_firestore_service
+
+                    bucket = FirestoreTokenBucket(get_firestore_service().db)
+                else:
+                    bucket = LocalTokenBucket()
+                _guard = ScholarGuard(bucket)
+    return _guard
+
+
+def scholar_call(fn, *args, acquire_timeout=None, **kwargs):
+    """Call a scholarly function through the process-wide ScholarGuard."""
+    return get_scholar_guard().call(fn, *args, acquire_timeout=acquire_timeout, **kwargs)
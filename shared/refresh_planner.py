@@ -0,0 +1,244 @@
+"""
+Planning of author refreshes.
+
+Each author is due for a refresh once the expected cost of serving stale data
+reaches Config.REFRESH_COST_THRESHOLD. The cost grows with the number of citations
+the stored copy is likely missing (its citation velocity times the time since it
+was fetched), weighted by how often the author is looked up. Authors that gain
+no citations are still refreshed every Config.REFRESH_MAX_AGE_DAYS days.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from .concurrency import submit
+from .config import Config
+
+DAY = 24 * 3600
+
+
+def citation_velocity(cites_per_year, now=None):
+    """Expected new citations per day, from the citations of the last two years."""
+    if not cites_per_year:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    counts = {int(year): int(count) for year, count in cites_per_year.items()}
+    # The current year is partial: extrapolate it to a full year
+    elapsed = max((now - datetime(now.year, 1, 1, tzinfo=timezone.utc)).total_seconds() / (365 * DAY), 1 / 12)
+    current = counts.get(now.year, 0) / elapsed
+    previous = counts.get(now.year - 1, 0)
+    return max(current, previous) / 365
+
+
+def view_counter(at=None):
+    """Name of the monthly page view counter of the author_views documents."""
+    at = at or datetime.now(timezone.utc)
+    return f"views_{at.year}{at.month:02d}"
+
+
+def recent_views(views, now=None):
+    """Page views of the current and the previous month."""
+    now = now or datetime.now(timezone.utc)
+    previous_month = datetime(now.year - (now.month == 1), (now.month - 2) % 12 + 1, 1, tzinfo=timezone.utc)
+    return sum(int(views.get(counter, 0)) for counter in {view_counter(now), view_counter(previous_month)})
+
+
+class RefreshPlanner:
+    """
+    Plans author refreshes from a schedule kept in Firestore.
+
+    Besides its monthly page view counters, the author_views document of each
+    author holds the inputs of its due time ("refresh": when it was fetched, its
+    citation velocity, and until when a planned refresh holds it back) and the due
+    time itself ("refresh_due_at"). The due time is updated when the author is
+    fetched, viewed or planned, so that planning is a query ordered by due time
+    and limited to the budget, and every instance sees the same schedule.
+    """
+
+    def __init__(self, firestore_service):
+        self.firestore_service = firestore_service
+
+    def _doc_ref(self, author_id):
+        return self.firestore_service.db.collection(Config.FIRESTORE_COLLECTION_AUTHOR_VIEWS).document(author_id)
+
+    def due_at(self, fetched_at, velocity, views):
+        demand = 1 + Config.REFRESH_VIEW_WEIGHT * views
+        expected_cost_per_day = velocity * demand
+        if expected_cost_per_day > 0:
+            delay = Config.REFRESH_COST_THRESHOLD / expected_cost_per_day * DAY
+        else:
+            delay = Config.REFRESH_MAX_AGE_DAYS * DAY
+        delay = min(max(delay, Config.REFRESH_MIN_AGE_DAYS * DAY), Config.REFRESH_MAX_AGE_DAYS * DAY)
+        return fetched_at + timedelta(seconds=delay)
+
+    def _scheduled_at(self, refresh, views):
+        due_at = self.due_at(refresh["fetched_at"], refresh["velocity"], recent_views(views))
+        return max(filter(None, [due_at, refresh.get("planned_until")]))
+
+    def _fetched_schedule(self, fetched_at, cites_per_year, views):
+        # A planned refresh has completed, so the author is no longer held back
+        refresh = {"fetched_at": fetched_at, "velocity": citation_velocity(cites_per_year), "planned_until": None}
+        return refresh, self._scheduled_at(refresh, views)
+
+    def record_fetch(self, author_id, fetched_at, cites_per_year=None):
+        """Schedule the next refresh of an author that was just fetched (`fetched_at` is a datetime)."""
+        doc_ref = self._doc_ref(author_id)
+        snapshot = doc_ref.get()
+        views = (snapshot.to_dict().get("data") if snapshot.exists else None) or {}
+        refresh, due_at = self._fetched_schedule(fetched_at, cites_per_year, views)
+        doc_ref.set({"refresh": refresh, "refresh_due_at": due_at}, merge=True)
+
+    def record_view(self, author_id):
+        """Count a page view of the author, bringing its next refresh forward if needed."""
+        if not self.firestore_service.increment_counter(
+            Config.FIRESTORE_COLLECTION_AUTHOR_VIEWS, author_id, view_counter()
+        ):
+            return False
+        doc_ref = self._doc_ref(author_id)
+        doc = doc_ref.get().to_dict() or {}
+        if not doc.get("refresh"):
+            return True  # not scheduled yet; see _plan_unscheduled
+        due_at = self._scheduled_at(doc["refresh"], doc.get("data") or {})
+        if due_at != doc.get("refresh_due_at"):
+            doc_ref.update({"refresh_due_at": due_at})
+        return True
+
+    def plan(self, budget, now=None):
+        """
+        Return up to `budget` authors that are due for a refresh, most overdue first.
+
+        Planned authors are held back for Config.REFRESH_RETRY_DELAY seconds, so that
+        the next ticks (on any instance) do not plan them again while their refresh
+        is in progress. The claims are independent transactions, run concurrently
+        on the shared I/O pool.
+        """
+        now = now or datetime.now(timezone.utc)
+        query = (
+            self.firestore_service.db.collection(Config.FIRESTORE_COLLECTION_AUTHOR_VIEWS)
+            .where("refresh_due_at", "<=", now)
+            .order_by("refresh_due_at")
+            .limit(budget)
+        )
+        snapshots = list(query.stream())
+        claims = [submit(self._claim, snapshot.reference, now) for snapshot in snapshots]
+        planned = [snapshot.id for snapshot, claim in zip(snapshots, claims) if claim.result()]
+        if len(planned) < budget:
+            planned += self._plan_unscheduled(budget - len(planned), now)
+        return planned
+
+    def _claim(self, doc_ref, now):
+        """Hold back a due author, unless another instance has planned it in the meantime."""
+        from google.cloud import firestore
+
+        @firestore.transactional
+        def claim(transaction):
+            doc = doc_ref.get(transaction=transaction).to_dict() or {}
+            if not doc.get("refresh") or doc.get("refresh_due_at") is None or doc["refresh_due_at"] > now:
+                return False
+            planned_until = now + timedelta(seconds=Config.REFRESH_RETRY_DELAY)
+            transaction.update(doc_ref, {"refresh.planned_until": planned_until, "refresh_due_at": planned_until})
+            return True
+
+        return claim(self.firestore_service.db.transaction())
+
+    def _schedule_and_claim(self, author_id, fetched_at, cites_per_year, now):
+        """
+        Schedule an author that has none yet, and hold it back if it is already due,
+        in one transaction. Authors scheduled in the meantime (fetched, or planned by
+        another instance) are left alone.
+        """
+        from google.cloud import firestore
+
+        doc_ref = self._doc_ref(author_id)
+
+        @firestore.transactional
+        def schedule(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            doc = (snapshot.to_dict() if snapshot.exists else None) or {}
+            if doc.get("refresh"):
+                return False
+            refresh, due_at = self._fetched_schedule(fetched_at, cites_per_year, doc.get("data") or {})
+            claimed = due_at <= now
+            if claimed:
+                refresh["planned_until"] = due_at = now + timedelta(seconds=Config.REFRESH_RETRY_DELAY)
+            transaction.set(doc_ref, {"refresh": refresh, "refresh_due_at": due_at}, merge=True)
+            return claimed
+
+        return schedule(self.firestore_service.db.transaction())
+
+    def _plan_unscheduled(self, budget, now):
+        """
+        Plan the least recently fetched authors that have no schedule yet (stored
+        before refresh planning existed), scheduling them on the way.
+
+        Authors are read one page of Config.REFRESH_BATCH_SIZE (or `budget`) at a
+        time, from a cursor kept in Firestore that wraps around at the end of the
+        collection, so that scheduled authors do not hide the unscheduled ones
+        stored after them.
+        """
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        cutoff = now - timedelta(days=Config.REFRESH_MIN_AGE_DAYS)
+        db = self.firestore_service.db
+        cursor, _ = self.firestore_service.get_firestore_cache(
+            Config.FIRESTORE_COLLECTION_REFRESH_PLANNER, "unscheduled_cursor", use_local_cache=False
+        )
+        page_size = max(budget, Config.REFRESH_BATCH_SIZE)
+        query = (
+            db.collection(Config.FIRESTORE_COLLECTION_AUTHOR)
+            .where("timestamp", "<", cutoff)
+            .order_by("timestamp")
+            .order_by(FieldPath.document_id())
+            .select(["data.cites_per_year", "timestamp"])
+        )
+        if cursor:
+            query = query.start_after({"timestamp": cursor["timestamp"], FieldPath.document_id(): cursor["author_id"]})
+        authors = [(snapshot.id, snapshot.to_dict()) for snapshot in query.limit(page_size).stream()]
+        if not authors:
+            if cursor:
+                self._store_unscheduled_cursor(None)
+            return []
+        scheduled = {
+            snapshot.id
+            for snapshot in db.get_all([self._doc_ref(author_id) for author_id, _ in authors])
+            if snapshot.exists and (snapshot.to_dict() or {}).get("refresh")
+        }
+
+        # Unscheduled authors are scheduled concurrently, in waves of the remaining budget
+        pending = [(author_id, doc) for author_id, doc in authors if author_id not in scheduled]
+        planned = []
+        while pending and len(planned) < budget:
+            wave, pending = pending[: budget - len(planned)], pending[budget - len(planned) :]
+            claims = [
+                submit(
+                    self._schedule_and_claim,
+                    author_id,
+                    doc["timestamp"],
+                    (doc.get("data") or {}).get("cites_per_year"),
+                    now,
+                )
+                for author_id, doc in wave
+            ]
+            planned += [author_id for (author_id, _), claim in zip(wave, claims) if claim.result()]
+            last = wave[-1]
+
+        # The next tick resumes after the last author examined, or from the start
+        # once the end of the collection is reached
+        if pending:
+            self._store_unscheduled_cursor(last)
+        elif len(authors) == page_size:
+            self._store_unscheduled_cursor(authors[-1])
+        else:
+            self._store_unscheduled_cursor(None)
+
+        if planned:
+            logging.info(f"Scheduled {len(planned)} authors stored before refresh planning")
+        return planned
+
+    def _store_unscheduled_cursor(self, author):
+        cursor = None
+        if author is not None:
+            author_id, doc = author
+            cursor = {"timestamp": doc["timestamp"], "author_id": author_id}
+        self.firestore_service.set_firestore_cache(
+            Config.FIRESTORE_COLLECTION_REFRESH_PLANNER, "unscheduled_cursor", cursor
+        )
@@ -0,0 +1,66 @@
+"""
+Process-wide service registry.
+
+Each service (and the Google Cloud client it wraps) is created on first use and
+then shared by every module of the process. The service modules themselves are
+imported lazily too, so that importing the app or a Cloud Function does not pay
+for client libraries it does not end up using.
+"""
+import threading
+
+_instances = {}
+_lock = threading.RLock()  # factories may look up the services they depend on
+
+
+def _get_or_create(name, factory):
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = _instances[name] = factory()
+    return instance
+
+
+def get_firestore_service():
+    from .services.firestore_service import FirestoreService
+
+    return _get_or_create("firestore_service", FirestoreService)
+
+
+def get_bigquery_service():
+    from .services.bigquery_service import BigQueryService
+
+    return _get_or_create("bigquery_service", BigQueryService)
+
+
+def get_task_queue_service():
+    from .services.task_queue_service import TaskQueueService
+
+    return _get_or_create("task_queue_service", TaskQueueService)
+
+
+def get_storage_service():
+    from .services.storage_service import StorageService
+
+    return _get_or_create("storage_service", StorageService)
+
+
+def get_publication_repository():
+    from .repositories.publication_repository import PublicationRepository
+
+    return _get_or_create("publication_repository", lambda: PublicationRepository(get_firestore_service()))
+
+
+def get_author_repository():
+    from .repositories.author_repository import AuthorRepository
+
+    return _get_or_create(
+        "author_repository", lambda: AuthorRepository(get_firestore_service(), get_publication_repository())
+    )
+
+
+def get_refresh_planner():
+    from .refresh_planner import RefreshPlanner
+
+    return _get_or_create("refresh_planner", lambda: RefreshPlanner(get_firestore_service()))
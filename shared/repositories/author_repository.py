@@ -1,40 +1,198 @@
+import logging
+import time
+from datetime import datetime, timezone
+
 from ..config import Config
 
 
 class AuthorRepository:
+    """
+    Authors with more than Config.AUTHOR_INLINE_PUBLICATIONS_MAX publications are
+    stored as a header document in the author collection (the author without its
+    publications, plus a "publication_shards" descriptor) and shard documents of
+    Config.AUTHOR_PUBLICATIONS_PER_SHARD publications in a subcollection of it.
+    Other authors are stored in a single document, as before.
+
+    get_author returns the same logical author either way; header-only reads
+    (get_author_header) skip the shards.
+    """
+
     def __init__(self, firestore_service, publication_repository):
         self.firestore_service = firestore_service
         self.publication_repository = publication_repository
 
+    @staticmethod
+    def shard_collection(author_id):
+        return f"{Config.FIRESTORE_COLLECTION_AUTHOR}/{author_id}/{Config.FIRESTORE_SUBCOLLECTION_PUBLICATION_SHARDS}"
+
+    @staticmethod
+    def num_publications(author):
+        """Number of publications of an author, from its header or full document."""
+        shards = author.get("publication_shards")
+        return shards["size"] if shards else len(author.get("publications", []))
+
     def get_author(self, author_id):
+        author = self.get_author_header(author_id)
+        return self.with_publications(author_id, author) if author else author
+
+    def get_author_header(self, author_id):
+        # For sharded authors this is the author without its publications
         return self.firestore_service.get_firestore_cache(Config.FIRESTORE_COLLECTION_AUTHOR, author_id)[0]
 
+    def with_publications(self, author_id, author):
+        """Return the full author for an author document, loading its publication shards if any."""
+        shards = author.get("publication_shards")
+        if not shards:
+            return author
+
+        publications = self._read_shards(author_id, shards)
+        if publications is None:
+            # The header may be an outdated local copy whose shards were deleted since:
+            # fetch the current one from Firestore
+            fresh, _ = self.firestore_service.get_firestore_cache(
+                Config.FIRESTORE_COLLECTION_AUTHOR, author_id, use_local_cache=False
+            )
+            if fresh and fresh.get("publication_shards", {}).get("generation") != shards["generation"]:
+                return self.with_publications(author_id, fresh)
+            raise RuntimeError(f"Missing publication shards of author {author_id}")
+
+        author = {key: value for key, value in author.items() if key != "publication_shards"}
+        author["publications"] = publications
+        return author
+
+    def _read_shards(self, author_id, shards):
+        """Publications of the shards described by a header, or None if any of them is missing."""
+        # All the shards are read in a single batched call
+        collection = self.shard_collection(author_id)
+        shard_ids = [f"{shards['generation']}-{index:04d}" for index in range(shards["count"])]
+        docs = self.firestore_service.get_many([(collection, shard_id) for shard_id in shard_ids])
+
+        publications = []
+        for shard_id in shard_ids:
+            shard, _ = docs[(collection, shard_id)]
+            if shard is None:
+                logging.warning(f"Missing publication shard {shard_id} of author {author_id}")
+                return None
+            publications.extend(shard["publications"])
+        return publications
+
     def save_author(self, author_id, author_data):
-        return self.firestore_service.set_firestore_cache(Config.FIRESTORE_COLLECTION_AUTHOR, author_id, author_data)
+        if not self._store_author(author_id, author_data):
+            return False
+        self.schedule_refresh(author_id, author_data)
+        return True
 
-    def get_author_last_modification(self, author_id):
-        # Fetch the last modification time of the author itself
-        _, latest_author_change = self.firestore_service.get_firestore_cache(Config.FIRESTORE_COLLECTION_AUTHOR, author_id)
+    def schedule_refresh(self, author_id, author_data):
+        """Schedule the next refresh of an author that was just stored."""
+        from ..registry import get_refresh_planner
 
-        # Use PublicationRepository to find the latest publication timestamp
-        latest_pub_change = self.publication_repository.get_latest_publication_timestamp(author_id)
+        try:
+            get_refresh_planner().record_fetch(
+                author_id, datetime.now(timezone.utc), author_data.get("cites_per_year")
+            )
+        except Exception as e:
+            logging.error(f"Error scheduling the next refresh of author {author_id}: {e}")
+
+    def _store_author(self, author_id, author_data):
+        publications = author_data.get("publications") or []
+        collection = self.shard_collection(author_id)
+        if len(publications) <= Config.AUTHOR_INLINE_PUBLICATIONS_MAX:
+            if not self.firestore_service.set_firestore_cache(Config.FIRESTORE_COLLECTION_AUTHOR, author_id, author_data):
+                return False
+            # An author stored inline has no shards: delete those left by a previous
+            # sharded version. Readers still holding its header find them missing and
+            # fetch the new document.
+            self.firestore_service.delete_documents(collection)
+            return True
+
+        # Shards of a new generation are written before the header that points to
+        # them, so readers never see a header with missing or mixed shards.
+        previous, _ = self.firestore_service.get_firestore_cache(
+            Config.FIRESTORE_COLLECTION_AUTHOR, author_id, use_local_cache=False
+        )
+        previous_generation = ((previous or {}).get("publication_shards") or {}).get("generation")
+        generation = str(int(time.time() * 1000))
+        size = Config.AUTHOR_PUBLICATIONS_PER_SHARD
+        shards = {
+            f"{generation}-{index:04d}": {"publications": publications[start : start + size]}
+            for index, start in enumerate(range(0, len(publications), size))
+        }
+        failed = self.firestore_service.set_many(collection, shards)
+        if failed:
+            logging.error(f"Failed to store {len(failed)} publication shards of author {author_id}")
+            return False
+
+        header = {key: value for key, value in author_data.items() if key != "publications"}
+        header["publication_shards"] = {"generation": generation, "count": len(shards), "size": len(publications)}
+        if not self.firestore_service.set_firestore_cache(Config.FIRESTORE_COLLECTION_AUTHOR, author_id, header):
+            return False
+
+        # Older generations are no longer referenced. The previous one is kept, as other
+        # instances may still hold its header in their local cache; readers that find
+        # shards missing anyway fetch the current header again.
+        kept = tuple(f"{g}-" for g in (generation, previous_generation) if g)
+        self.firestore_service.delete_documents(collection, keep=lambda shard_id: shard_id.startswith(kept))
+        return True
+
+    def get_author_last_modification(self, author_id, latest_author_change=None, latest_watermark=None):
+        # Fetch the last modification time of the author itself, unless the caller already has it
+        if latest_author_change is None:
+            _, latest_author_change = self.firestore_service.get_firestore_cache(
+                Config.FIRESTORE_COLLECTION_AUTHOR, author_id
+            )
+
+        # The watermark tracks the latest write to any of the author's publications
+        if latest_watermark is None:
+            _, latest_watermark = self.firestore_service.get_firestore_cache(
+                Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id
+            )
+        if latest_watermark is None:
+            latest_watermark = self.rebuild_last_modification(author_id, latest_author_change)
 
         # Compare and return the latest of the two timestamps
-        return max(filter(None, [latest_author_change, latest_pub_change]))
+        return max(filter(None, [latest_author_change, latest_watermark]))
+
+    def touch_last_modification(self, author_id, timestamp=None):
+        """
+        Advance the last-modified watermark of an author.
+
+        Every writer of author or publication documents calls this after a successful
+        write, so that freshness checks need a single document read.
+        """
+        return self.firestore_service.set_firestore_cache(
+            Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id, {"scholar_id": author_id}, timestamp=timestamp
+        )
+
+    def rebuild_last_modification(self, author_id, latest_author_change=None):
+        """
+        Recompute the watermark of an author from a full scan of its publications.
+
+        Used to backfill authors written before the watermark existed, or to repair it.
+        Authors without stored publications get a watermark at `latest_author_change`
+        (the time of the author document), so that the scan is not repeated.
+        """
+        latest_pub_change = self.publication_repository.get_latest_publication_timestamp(author_id)
+        watermark = latest_pub_change or latest_author_change
+        if watermark is not None:
+            self.touch_last_modification(author_id, watermark)
+        return latest_pub_change
 
     def get_authors_needing_refresh(self, num_authors=1):
         """
-        Fetch author IDs that need refreshing based on their last update timestamp.
+        Fetch the author IDs most worth refreshing, according to the refresh planner.
 
         Parameters:
-        - num_authors: The number of author IDs to fetch.
+        - num_authors: The maximum number of author IDs to fetch (the per-tick budget).
 
         Returns:
-        A list of author IDs.
+        A list of author IDs, possibly shorter than num_authors if fewer are due.
         """
-        return self.firestore_service.objects_needing_refresh(
-            collection=Config.FIRESTORE_COLLECTION_AUTHOR,
-            days_since_last_update=90,  # Considering authors not updated in the last 90 days
-            limit=num_authors,
-            key_attr="scholar_id",
-        )
+        from ..registry import get_refresh_planner
+
+        return get_refresh_planner().plan(num_authors)
+
+    def record_view(self, author_id):
+        """Count a page view of the author, for refresh planning."""
+        from ..registry import get_refresh_planner
+
+        return get_refresh_planner().record_view(author_id)
@@ -10,12 +10,24 @@ class PublicationRepository:
         return self.firestore_service.query_by_prefix(Config.FIRESTORE_COLLECTION_PUB, "data.author_pub_id", author_id)
 
     def save_publication(self, author_pub_id, publication_data):
-        self.firestore_service.set_firestore_cache(Config.FIRESTORE_COLLECTION_PUB, author_pub_id, publication_data)
+        return self.firestore_service.set_firestore_cache(Config.FIRESTORE_COLLECTION_PUB, author_pub_id, publication_data)
+
+    def save_publications(self, publications):
+        # Returns the author_pub_ids that could not be saved
+        return self.firestore_service.set_many(Config.FIRESTORE_COLLECTION_PUB, publications)
 
     def get_publication(self, author_pub_id):
         return self.firestore_service.get_firestore_cache(Config.FIRESTORE_COLLECTION_PUB, author_pub_id)[0]
 
+    def get_publications(self, author_pub_ids):
+        # Batched read that bypasses the local cache; missing publications map to None
+        refs = [(Config.FIRESTORE_COLLECTION_PUB, author_pub_id) for author_pub_id in author_pub_ids]
+        docs = self.firestore_service.get_many(refs, use_local_cache=False)
+        return {doc_id: data for (_, doc_id), (data, _) in docs.items()}
+
     def get_latest_publication_timestamp(self, author_id):
+        # Scans every publication of the author; use the author's last-modified
+        # watermark for freshness checks and keep this for repairs/backfills.
         publications = self.firestore_service.query_by_prefix(Config.FIRESTORE_COLLECTION_PUB, "data.author_pub_id", author_id)
         timestamps = [pub["timestamp"] for pub in publications if "timestamp" in pub]
         return max(timestamps) if timestamps else None
@@ -0,0 +1,238 @@
+import csv
+import io
+import logging
+import threading
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+
+from .config import Config
+
+
+def load_percentile_table(source):
+    """
+    Load a percentile table as written by notebooks/Percentiles_for_Publications.ipynb.
+
+    The first column holds the row keys (paper age, or years since first publication)
+    and every other column header is a percentile between 0 and 100; each cell is the
+    number of citations (or papers) needed to reach that percentile.
+
+    :param source: A local path or an http(s) URL of the CSV file.
+    :return: A tuple (row_keys, percentiles, thresholds) of NumPy arrays, with
+             thresholds of shape (len(row_keys), len(percentiles)).
+    """
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=30) as response:
+            text = response.read().decode("utf-8")
+    else:
+        with open(source, encoding="utf-8") as f:
+            text = f.read()
+
+    rows = csv.reader(io.StringIO(text))
+    header = next(rows)
+    percentiles = np.array([float(p) for p in header[1:]])
+    keys, thresholds = [], []
+    for row in rows:
+        if not row:
+            continue
+        keys.append(float(row[0]))
+        thresholds.append([float(v) for v in row[1:]])
+
+    order = np.argsort(keys)
+    return np.array(keys)[order], percentiles, np.array(thresholds)[order]
+
+
+class PercentileScorer:
+    """
+    Vectorized percentile scoring of publications and authors.
+
+    Computes the same numbers as the statistics tables in BigQuery
+    (num_citations_percentile, publication_rank, num_papers_percentile), from the
+    age x percentile citation table and the years-since-first-publication x
+    percentile paper-count table.
+    """
+
+    def __init__(self, citation_ages, citation_percentiles, citation_thresholds, papers_years, papers_percentiles, papers_thresholds):
+        self.citation_ages = np.asarray(citation_ages, dtype=float)
+        self.citation_percentiles = np.asarray(citation_percentiles, dtype=float)
+        # Thresholds are non-decreasing along each row; enforce it so that searchsorted is valid
+        self.citation_thresholds = np.maximum.accumulate(np.asarray(citation_thresholds, dtype=float), axis=1)
+        self.papers_years = np.asarray(papers_years, dtype=float)
+        self.papers_percentiles = np.asarray(papers_percentiles, dtype=float)
+        self.papers_thresholds = np.maximum.accumulate(np.asarray(papers_thresholds, dtype=float), axis=1)
+
+        # Rows are stacked one after the other in a single sorted array, each shifted
+        # by a constant offset, so that one searchsorted call serves papers of any age.
+        span = self.citation_thresholds.max() - self.citation_thresholds.min() + 1
+        self._row_offsets = np.arange(len(self.citation_ages)) * span
+        self._flat_citation_thresholds = (self.citation_thresholds + self._row_offsets[:, None]).ravel()
+
+    @classmethod
+    def from_csv(cls, citations_source=None, papers_source=None):
+        citation_ages, citation_percentiles, citation_thresholds = load_percentile_table(
+            citations_source or Config.CITATION_PERCENTILES_CSV
+        )
+        papers_years, papers_percentiles, papers_thresholds = load_percentile_table(
+            papers_source or Config.NUMPAPERS_PERCENTILES_CSV
+        )
+        return cls(
+            citation_ages, citation_percentiles, citation_thresholds, papers_years, papers_percentiles, papers_thresholds
+        )
+
+    @staticmethod
+    def _nearest_rows(keys, values):
+        # Index of the closest row key for each value (ties go to the smaller key)
+        pos = np.clip(np.searchsorted(keys, values), 1, len(keys) - 1)
+        left, right = keys[pos - 1], keys[pos]
+        return np.where(np.abs(values - left) <= np.abs(right - values), pos - 1, pos)
+
+    def citation_percentiles_for(self, ages, citations):
+        """
+        Percentile (0-1) of each paper's citations among papers of the same age.
+
+        Thresholds repeat across neighbouring percentiles; like the original notebook
+        implementation, each threshold value maps to the lowest percentile that has it,
+        and citations between two threshold values are linearly interpolated.
+        """
+        ages = np.asarray(ages, dtype=float)
+        citations = np.asarray(citations, dtype=float)
+        if citations.size == 0:
+            return np.zeros(0)
+
+        rows = self._nearest_rows(self.citation_ages, ages)
+        row_min = self.citation_thresholds[rows, 0]
+        row_max = self.citation_thresholds[rows, -1]
+        clipped = np.clip(citations, row_min, row_max)
+
+        width = len(self.citation_percentiles)
+        offsets = self._row_offsets[rows]
+        flat = self._flat_citation_thresholds
+        # Largest threshold value <= citations, and its first (lowest) percentile
+        last_below = np.clip(np.searchsorted(flat, clipped + offsets, side="right") - 1 - rows * width, 0, width - 1)
+        lower = self.citation_thresholds[rows, last_below]
+        below = np.clip(np.searchsorted(flat, lower + offsets, side="left") - rows * width, 0, width - 1)
+        # First percentile whose threshold is >= citations
+        above = np.clip(np.searchsorted(flat, clipped + offsets, side="left") - rows * width, 0, width - 1)
+
+        upper = self.citation_thresholds[rows, above]
+        p_below = self.citation_percentiles[below]
+        p_above = self.citation_percentiles[above]
+        gap = upper - lower
+        weight = np.divide(clipped - lower, gap, out=np.zeros_like(gap), where=gap > 0)
+        scores = np.where(gap > 0, p_below + weight * (p_above - p_below), p_below)
+
+        scores = np.where(citations <= row_min, 0.0, scores)
+        scores = np.where(citations >= row_max, 100.0, scores)
+        return scores / 100
+
+    def num_papers_percentiles_for(self, years_active, paper_counts):
+        """
+        Percentile (0-1) of each paper count among authors active for the same number of years.
+
+        Each count maps to the highest percentile whose threshold is closest to it.
+        """
+        paper_counts = np.asarray(paper_counts, dtype=float)
+        row = self._nearest_rows(self.papers_years, np.array([float(years_active)]))[0]
+        thresholds = self.papers_thresholds[row]
+
+        # Thresholds repeat across percentiles; keep the highest percentile of each value
+        values, first_index = np.unique(thresholds[::-1], return_index=True)
+        highest = self.papers_percentiles[::-1][first_index]
+
+        pos = np.clip(np.searchsorted(values, paper_counts), 0, len(values) - 1)
+        left = np.clip(pos - 1, 0, len(values) - 1)
+        closest = np.where(np.abs(paper_counts - values[left]) <= np.abs(values[pos] - paper_counts), left, pos)
+        return highest[closest] / 100
+
+    def score_author(self, publications, current_year=None):
+        """
+        Score all publications of an author in one vectorized pass.
+
+        :param publications: Publication entries as stored in the author document
+                             (author_pub_id, num_citations and bib.pub_year).
+        :param current_year: The year used to compute the age of each paper.
+        :return: A list of publication records ordered by publication_rank, with the
+                 same fields as BigQueryService.get_author_pub_stats.
+        """
+        current_year = current_year or datetime.now().year
+        scored = []
+        for pub in publications:
+            pub_year = (pub.get("bib") or {}).get("pub_year")
+            num_citations = pub.get("num_citations") or 0
+            try:
+                pub_year, num_citations = int(pub_year), int(num_citations)
+            except (TypeError, ValueError):
+                continue
+            # Like the statistics tables, only papers with at least one citation are ranked
+            if num_citations > 0:
+                scored.append((pub, pub_year, num_citations))
+        if not scored:
+            return []
+
+        pub_years = np.array([pub_year for _, pub_year, _ in scored], dtype=float)
+        citations = np.array([num_citations for _, _, num_citations in scored], dtype=float)
+        ages = current_year - pub_years + 1
+
+        percentiles = np.round(self.citation_percentiles_for(ages, citations), 4)
+        # Rank by decreasing percentile; ties keep the original order
+        order = np.argsort(-percentiles, kind="stable")
+        ranks = np.empty(len(order), dtype=int)
+        ranks[order] = np.arange(1, len(order) + 1)
+        papers_percentiles = self.num_papers_percentiles_for(ages.max(), ranks)
+
+        return [
+            {
+                "author_pub_id": scored[i][0].get("author_pub_id"),
+                "title": (scored[i][0].get("bib") or {}).get("title"),
+                "citation": (scored[i][0].get("bib") or {}).get("citation"),
+                "pub_year": scored[i][1],
+                "num_citations": scored[i][2],
+                "num_citations_percentile": float(percentiles[i]),
+                "publication_rank": int(ranks[i]),
+                "num_papers_percentile": float(papers_percentiles[i]),
+            }
+            for i in order
+        ]
+
+    def score_author_stats(self, author, scored_publications, current_year=None):
+        """
+        Author-level stats computable without the author tables in BigQuery.
+
+        :param author: The author document, for the counts Google Scholar reports
+                       (citedby, hindex, i10index and their 5-year versions).
+        :param scored_publications: The records returned by score_author.
+        :param current_year: The year used to compute the years active.
+        :return: A dict with the fields of BigQueryService.get_author_stats that can be
+                 computed locally; the other percentiles and the PiP-AUC score are left out.
+        """
+        current_year = current_year or datetime.now().year
+        stats = {
+            field: author.get(field)
+            for field in ("citedby", "citedby5y", "hindex", "hindex5y", "i10index", "i10index5y")
+            if author.get(field) is not None
+        }
+        if scored_publications:
+            year_of_first_pub = min(pub["pub_year"] for pub in scored_publications)
+            total = len(scored_publications)
+            stats["year_of_first_pub"] = year_of_first_pub
+            stats["total_publications_with_citations"] = total
+            stats["total_publications_with_citations_percentile"] = float(
+                self.num_papers_percentiles_for(current_year - year_of_first_pub + 1, [total])[0]
+            )
+        return stats
+
+
+_default_scorer = None
+_default_scorer_lock = threading.Lock()
+
+
+def get_scorer():
+    """Return the process-wide PercentileScorer, loading the tables on first use."""
+    global _default_scorer
+    if _default_scorer is None:
+        with _default_scorer_lock:
+            if _default_scorer is None:
+                logging.info("Loading percentile tables for local scoring.")
+                _default_scorer = PercentileScorer.from_csv()
+    return _default_scorer
@@ -1,4 +1,5 @@
 from google.cloud import bigquery
+from google.cloud import bigquery_storage
 from datetime import datetime
 from ..config import Config  # Ensure this import matches your project structure
 
@@ -6,14 +7,60 @@ from ..config import Config  # Ensure this import matches your project structure
 class BigQueryService:
     def __init__(self):
         self.client = bigquery.Client(project=Config.PROJECT_ID)
+        self._bqstorage_client = None
 
-    def query(self, sql):
-        query_job = self.client.query(sql)
-        results = query_job.result()
-        return results.to_dataframe()
+    @property
+    def bqstorage_client(self):
+        # Created on first use; results are downloaded as Arrow record batches
+        # through the BigQuery Storage Read API.
+        if self._bqstorage_client is None:
+            self._bqstorage_client = bigquery_storage.BigQueryReadClient()
+        return self._bqstorage_client
 
-    def get_author_pub_stats(self, author_id):
-        sql = f"""
+    def _run(self, sql, params=None):
+        # Query parameters keep the SQL text constant across calls, so it is
+        # never built from user input and BigQuery can reuse cached results.
+        job_config = bigquery.QueryJobConfig(query_parameters=params or [])
+        query_job = self.client.query(sql, job_config=job_config)
+        return query_job.result()
+
+    def query(self, sql, params=None, result_format="dataframe"):
+        """
+        Run a query and return all its results.
+
+        :param sql: The SQL text, with @name placeholders for the query parameters.
+        :param params: A list of bigquery query parameters.
+        :param result_format: "dataframe" for a pandas DataFrame, "records" for a list of
+                              dicts, or "columns" for a dict of column lists. The last two
+                              are built straight from Arrow, without going through pandas.
+        """
+        results = self._run(sql, params)
+        if result_format == "records":
+            return results.to_arrow(bqstorage_client=self.bqstorage_client).to_pylist()
+        if result_format == "columns":
+            return results.to_arrow(bqstorage_client=self.bqstorage_client).to_pydict()
+        if result_format == "dataframe":
+            return results.to_dataframe(bqstorage_client=self.bqstorage_client)
+        raise ValueError(f"Unknown result format: {result_format}")
+
+    def stream(self, sql, params=None):
+        """
+        Run a query and yield its results as pyarrow.RecordBatch objects, so that
+        large results never have to be held in memory at once.
+        """
+        results = self._run(sql, params)
+        yield from results.to_arrow_iterable(bqstorage_client=self.bqstorage_client)
+
+    def get_authors_pub_stats(self, author_ids):
+        """
+        Fetch the publication stats of several authors with a single query.
+
+        :param author_ids: The Google Scholar IDs of the authors.
+        :return: A dict mapping each author ID to its list of publication records,
+                 ordered by publication rank.
+        """
+        author_ids = list(dict.fromkeys(author_ids))
+        sql = """
             WITH pub_details AS ((
                 SELECT
                     JSON_EXTRACT_SCALAR(DATA, '$.data.author_pub_id') AS author_pub_id,
@@ -23,36 +70,66 @@ class BigQueryService:
                     CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.num_citations') AS INT64) AS num_citations
                 FROM `scholar-version2.firestore_export.scholar_raw_pub_raw_latest`
             ))
-            SELECT P.*, S.num_citations_percentile, S.publication_rank, S.num_papers_percentile
+            SELECT S.scholar_id, P.*, S.num_citations_percentile, S.publication_rank, S.num_papers_percentile
             FROM `scholar-version2.statistics.author_pub_stats` S
             JOIN pub_details P ON P.author_pub_id = S.author_pub_id
-            WHERE S.scholar_id = '{author_id}'
-            ORDER BY S.publication_rank
+            WHERE S.scholar_id IN UNNEST(@scholar_ids)
+            ORDER BY S.scholar_id, S.publication_rank
         """
-        return self.query(sql).to_dict("records")
+        params = [bigquery.ArrayQueryParameter("scholar_ids", "STRING", author_ids)]
+        results = {author_id: [] for author_id in author_ids}
+        if not author_ids:
+            return results
+        for record in self.query(sql, params, result_format="records"):
+            results[record.pop("scholar_id")].append(record)
+        return results
 
-    def get_author_stats(self, author_id):
-        sql = f"""
-            SELECT S.*, P.pip_auc_score, P.pip_auc_score_percentile
-            FROM `scholar-version2.statistics.author_stats` S
-            LEFT JOIN `scholar-version2.statistics.author_pip_scores` P ON P.scholar_id = S.scholar_id
-            WHERE S.scholar_id = '{author_id}'
+    def get_author_pub_stats(self, author_id):
+        return self.get_authors_pub_stats([author_id])[author_id]
+
+    def get_authors_stats(self, author_ids):
         """
-        df = self.query(sql)
-        return df.to_dict("records")[0] if len(df) == 1 else None
+        Fetch the stats of several authors with a single query.
 
-    def get_all_authors_stats(self):
+        :param author_ids: The Google Scholar IDs of the authors.
+        :return: A dict mapping each author ID to its stats record, or None if the
+                 author has no (or no unique) stats row.
+        """
+        author_ids = list(dict.fromkeys(author_ids))
         sql = """
             SELECT S.*, P.pip_auc_score, P.pip_auc_score_percentile
             FROM `scholar-version2.statistics.author_stats` S
             LEFT JOIN `scholar-version2.statistics.author_pip_scores` P ON P.scholar_id = S.scholar_id
+            WHERE S.scholar_id IN UNNEST(@scholar_ids)
         """
-        df = self.query(sql)
+        params = [bigquery.ArrayQueryParameter("scholar_ids", "STRING", author_ids)]
+        records = {author_id: [] for author_id in author_ids}
+        if author_ids:
+            # Stays on the pandas path: missing PiP scores (LEFT JOIN) must come back
+            # as NaN rather than None, as the results page does arithmetic on them.
+            for record in self.query(sql, params).to_dict("records"):
+                records[record["scholar_id"]].append(record)
+        return {author_id: rows[0] if len(rows) == 1 else None for author_id, rows in records.items()}
+
+    def get_author_stats(self, author_id):
+        return self.get_authors_stats([author_id])[author_id]
+
+    ALL_AUTHORS_STATS_SQL = """
+        SELECT S.*, P.pip_auc_score, P.pip_auc_score_percentile
+        FROM `scholar-version2.statistics.author_stats` S
+        LEFT JOIN `scholar-version2.statistics.author_pip_scores` P ON P.scholar_id = S.scholar_id
+    """
+
+    def get_all_authors_stats(self):
+        df = self.query(self.ALL_AUTHORS_STATS_SQL)
         return df
 
+    def iter_all_authors_stats(self):
+        """Yield the stats of all authors as pyarrow.RecordBatch objects."""
+        return self.stream(self.ALL_AUTHORS_STATS_SQL)
+
     def get_publication_stats(self, author_pub_id):
-        current_year = datetime.now().year
-        sql = f"""
+        sql = """
             SELECT
               citation_year,
               age,
@@ -63,10 +140,14 @@ class BigQueryService:
             FROM
               `scholar-version2.statistics.publication_citations`
             WHERE
-              author_pub_id = '{author_pub_id}'
+              author_pub_id = @author_pub_id
               AND citation_year >= pub_year
-              AND citation_year <= {current_year}
+              AND citation_year <= @current_year
             ORDER BY citation_year
         """
-        df = self.query(sql).to_dict("records")
+        params = [
+            bigquery.ScalarQueryParameter("author_pub_id", "STRING", author_pub_id),
+            bigquery.ScalarQueryParameter("current_year", "INT64", datetime.now().year),
+        ]
+        df = self.query(sql, params, result_format="records")
         return df
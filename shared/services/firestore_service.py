@@ -1,15 +1,203 @@
+import copy
 import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from google.api_core import exceptions
 from google.cloud import firestore
-from datetime import datetime, timedelta
+from datetime import datetime
 import pytz
 from ..config import Config
 
 
+class LocalCache:
+    """
+    Bounded in-process LRU cache for Firestore cache documents.
+
+    Entries are keyed by (collection, doc_id) and hold the (data, timestamp)
+    pair stored in Firestore. Each collection has its own TTL, since documents
+    written by other processes (the Cloud Functions) can only be picked up once
+    the local copy expires.
+    """
+
+    def __init__(self, max_entries=None, ttls=None, default_ttl=None):
+        self.max_entries = max_entries or Config.FIRESTORE_LOCAL_CACHE_MAX_ENTRIES
+        self.ttls = Config.FIRESTORE_LOCAL_CACHE_TTLS if ttls is None else ttls
+        self.default_ttl = Config.FIRESTORE_LOCAL_CACHE_DEFAULT_TTL if default_ttl is None else default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, collection, doc_id):
+        """Return the cached (data, timestamp) pair, or None on a miss or expired entry."""
+        key = (collection, doc_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            data, timestamp, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers routinely decorate the returned dict (e.g. author["stats"] = ...),
+        # so hand out a shallow copy to keep the cached value intact.
+        return copy.copy(data), timestamp
+
+    def put(self, collection, doc_id, data, timestamp):
+        """Store an entry unless a newer version of the document is already cached."""
+        ttl = self.ttls.get(collection, self.default_ttl)
+        if ttl <= 0:
+            return
+        key = (collection, doc_id)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and timestamp is not None and current[1] is not None and current[1] > timestamp:
+                return
+            self._entries[key] = (copy.copy(data), timestamp, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection, doc_id):
+        with self._lock:
+            self._entries.pop((collection, doc_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class FirestoreBulkWriter:
+    """
+    Buffered writer for cache documents, to be used as a context manager.
+
+    Writes are committed in batches of up to 500 documents (the Firestore limit).
+    Throttled commits are retried with exponential backoff; a batch that fails for
+    any other reason is retried document by document, so that failures are
+    reported per document in `failures`.
+    """
+
+    MAX_BATCH_SIZE = 500
+    _DELETE = object()  # marks a pending deletion
+    RETRYABLE_ERRORS = (
+        exceptions.ResourceExhausted,
+        exceptions.Aborted,
+        exceptions.DeadlineExceeded,
+        exceptions.ServiceUnavailable,
+    )
+
+    def __init__(self, firestore_service, batch_size=MAX_BATCH_SIZE, max_retries=5):
+        self.firestore_service = firestore_service
+        self.batch_size = min(batch_size, self.MAX_BATCH_SIZE)
+        self.max_retries = max_retries
+        self.written = 0
+        self.failures = {}  # (collection, doc_id) -> error message
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+    def set(self, collection, doc_id, data, timestamp=None):
+        if not doc_id or not doc_id.strip():
+            logging.error("Firestore document ID is empty or invalid.")
+            self.failures[(collection, doc_id)] = "Invalid document ID"
+            return
+        timestamp = timestamp or datetime.utcnow().replace(tzinfo=pytz.utc)
+        self._pending.append((collection, doc_id, data, timestamp))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def delete(self, collection, doc_id):
+        self._pending.append((collection, doc_id, self._DELETE, None))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        while self._pending:
+            writes, self._pending = self._pending[: self.batch_size], self._pending[self.batch_size :]
+            try:
+                self._commit(writes)
+            except Exception as e:
+                logging.error(f"Error committing batch of {len(writes)} documents to Firestore: {e}")
+                if len(writes) == 1:
+                    collection, doc_id, _, _ = writes[0]
+                    self.failures[(collection, doc_id)] = str(e)
+                    self.firestore_service.local_cache.invalidate(collection, doc_id)
+                else:
+                    # Isolate the failing documents
+                    for write in writes:
+                        try:
+                            self._commit([write])
+                        except Exception as doc_error:
+                            collection, doc_id, _, _ = write
+                            self.failures[(collection, doc_id)] = str(doc_error)
+                            self.firestore_service.local_cache.invalidate(collection, doc_id)
+
+    def _commit(self, writes):
+        db = self.firestore_service.db
+        attempt = 0
+        while True:
+            batch = db.batch()
+            for collection, doc_id, data, timestamp in writes:
+                doc_ref = db.collection(collection).document(doc_id)
+                if data is self._DELETE:
+                    batch.delete(doc_ref)
+                else:
+                    batch.set(doc_ref, {"timestamp": timestamp, "data": data})
+            try:
+                batch.commit()
+                break
+            except self.RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(30, 0.5 * 2**attempt) * random.uniform(0.5, 1.5)
+                logging.warning(f"Firestore commit throttled ({e}); retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                attempt += 1
+
+        logging.info(f"Data set in Firestore for {len(writes)} documents.")
+        self.written += len(writes)
+        for collection, doc_id, data, timestamp in writes:
+            if data is self._DELETE:
+                self.firestore_service.local_cache.invalidate(collection, doc_id)
+            else:
+                self.firestore_service.local_cache.put(collection, doc_id, data, timestamp)
+
+
 class FirestoreService:
-    def __init__(self):
+    def __init__(self, local_cache=None):
         self.db = firestore.Client(project=Config.PROJECT_ID)
+        self.local_cache = local_cache if local_cache is not None else LocalCache()
+
+    def get_firestore_cache(self, collection, doc_id, use_local_cache=True):
+        if use_local_cache:
+            cached = self.local_cache.get(collection, doc_id)
+            if cached is not None:
+                logging.info(f"Local cache hit for '{doc_id}' in collection {collection}.")
+                return cached
 
-    def get_firestore_cache(self, collection, doc_id):
         logging.info(f"Fetching from Firestore for '{doc_id}' in collection {collection}.")
         doc_ref = self.db.collection(collection).document(doc_id)
         try:
@@ -18,28 +206,133 @@ class FirestoreService:
                 cached_data = doc.to_dict()
                 cached_time = cached_data["timestamp"]
                 logging.info(f"Fetched data from Firestore for '{doc_id}'.")
+                self.local_cache.put(collection, doc_id, cached_data["data"], cached_time)
                 return cached_data["data"], cached_time
         except Exception as e:
             logging.error(f"Error accessing Firestore: {e}")
         return None, None
 
-    def set_firestore_cache(self, collection, doc_id, data):
+    def get_many(self, refs, use_local_cache=True):
+        """
+        Fetch several cache documents in a single Firestore round trip.
+
+        :param refs: An iterable of (collection, doc_id) pairs.
+        :param use_local_cache: Serve documents from the in-process cache when possible.
+        :return: A dict mapping each (collection, doc_id) pair to a (data, timestamp) tuple,
+                 or (None, None) for documents that do not exist.
+        """
+        results = {}
+        pending = []
+        for collection, doc_id in refs:
+            key = (collection, doc_id)
+            if key in results or key in pending:
+                continue
+            if not doc_id or not doc_id.strip():
+                results[key] = (None, None)
+                continue
+            if use_local_cache:
+                cached = self.local_cache.get(collection, doc_id)
+                if cached is not None:
+                    results[key] = cached
+                    continue
+            pending.append(key)
+
+        if pending:
+            logging.info(f"Fetching {len(pending)} documents from Firestore in one batch.")
+            doc_refs = [self.db.collection(collection).document(doc_id) for collection, doc_id in pending]
+            try:
+                for doc in self.db.get_all(doc_refs):
+                    if not doc.exists:
+                        continue
+                    # The collection path, which differs from parent.id for subcollections
+                    key = tuple(doc.reference.path.rsplit("/", 1))
+                    cached_data = doc.to_dict()
+                    cached_time = cached_data["timestamp"]
+                    self.local_cache.put(key[0], key[1], cached_data["data"], cached_time)
+                    results[key] = (cached_data["data"], cached_time)
+            except Exception as e:
+                logging.error(f"Error accessing Firestore: {e}")
+
+        for key in pending:
+            results.setdefault(key, (None, None))
+        return results
+
+    def set_firestore_cache(self, collection, doc_id, data, timestamp=None):
         if not doc_id.strip():
             logging.error("Firestore document ID is empty or invalid.")
             return False
 
         doc_ref = self.db.collection(collection).document(doc_id)
-        current_time = datetime.utcnow().replace(tzinfo=pytz.utc)
+        current_time = timestamp or datetime.utcnow().replace(tzinfo=pytz.utc)
         cache_data = {"timestamp": current_time, "data": data}
 
         try:
             doc_ref.set(cache_data)
             logging.info(f"Data set in Firestore for '{doc_id}'.")
+            self.local_cache.put(collection, doc_id, data, current_time)
             return True  # success
         except Exception as e:
             logging.error(f"Error updating Firestore: {e}")
+            self.local_cache.invalidate(collection, doc_id)
             return False  # failure
 
+    def delete_documents(self, collection, keep=None):
+        """
+        Delete the documents of a collection, except those whose ID satisfies `keep`.
+
+        :return: The number of deleted documents.
+        """
+        deleted = 0
+        try:
+            with self.bulk_writer() as writer:
+                for doc_ref in self.db.collection(collection).list_documents():
+                    if keep is not None and keep(doc_ref.id):
+                        continue
+                    writer.delete(collection, doc_ref.id)
+                    deleted += 1
+        except Exception as e:
+            logging.error(f"Error deleting documents of {collection} from Firestore: {e}")
+        return deleted
+
+    def increment_counter(self, collection, doc_id, counter, amount=1):
+        """
+        Atomically add `amount` to the `counter` field of a cache document's data,
+        creating the document if needed, and set its timestamp to now.
+        """
+        doc_ref = self.db.collection(collection).document(doc_id)
+        current_time = datetime.utcnow().replace(tzinfo=pytz.utc)
+        try:
+            doc_ref.set({"timestamp": current_time, "data": {counter: firestore.Increment(amount)}}, merge=True)
+            self.local_cache.invalidate(collection, doc_id)
+            return True
+        except Exception as e:
+            logging.error(f"Error incrementing {counter} of '{doc_id}' in Firestore: {e}")
+            return False
+
+    def bulk_writer(self, **kwargs):
+        """
+        Return a FirestoreBulkWriter for writing many cache documents.
+
+        Usage:
+            with firestore_service.bulk_writer() as writer:
+                writer.set(collection, doc_id, data)
+            failures = writer.failures
+        """
+        return FirestoreBulkWriter(self, **kwargs)
+
+    def set_many(self, collection, docs):
+        """
+        Write several cache documents of a collection with batched commits.
+
+        :param collection: The name of the Firestore collection.
+        :param docs: A dict mapping document IDs to the data to cache.
+        :return: The list of document IDs that could not be written.
+        """
+        with self.bulk_writer() as writer:
+            for doc_id, data in docs.items():
+                writer.set(collection, doc_id, data)
+        return [doc_id for _, doc_id in writer.failures]
+
     def query_by_prefix(self, collection, field, prefix):
         """
         Perform a query in a Firestore collection using a prefix on a specified field.
@@ -54,25 +347,21 @@ class FirestoreService:
         results = query.stream()
         return [doc.to_dict() for doc in results]
 
-    def objects_needing_refresh(self, collection, days_since_last_update, limit, key_attr):
+    def stream_documents(self, collection, fields=None, updated_after=None):
         """
-        Fetch objects from a collection that have not been updated recently.
-
-        Parameters:
-        - collection: The Firestore collection name.
-        - days_since_last_update: Number of days to consider for an object being outdated.
-        - limit: Maximum number of objects to fetch.
-        - key_attr: The key attribute in the document to return.
+        Stream the cache documents of a collection, bypassing the local cache.
 
-        Returns:
-        A list of values for the key attribute from documents that match the criteria.
+        :param collection: The name of the Firestore collection.
+        :param fields: Optional field paths to read (e.g. "data.name"), to avoid
+                       transferring whole documents.
+        :param updated_after: Only return documents with a later timestamp.
+        :return: An iterator of (doc_id, data, timestamp) tuples.
         """
-        cutoff_date = datetime.utcnow().replace(tzinfo=pytz.utc) - timedelta(days=days_since_last_update)
-        query = (
-            self.db.collection(collection)
-            .where("timestamp", "<", cutoff_date)
-            .order_by("timestamp", direction=firestore.Query.ASCENDING)
-            .limit(limit)
-        )
-
-        return [doc.to_dict().get(key_attr) for doc in query.stream() if key_attr in doc.to_dict()]
+        query = self.db.collection(collection)
+        if updated_after is not None:
+            query = query.where("timestamp", ">", updated_after).order_by("timestamp")
+        if fields:
+            query = query.select(list(fields) + ["timestamp"])
+        for doc in query.stream():
+            doc_dict = doc.to_dict()
+            yield doc.id, doc_dict.get("data"), doc_dict.get("timestamp")
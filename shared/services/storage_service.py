@@ -1,3 +1,4 @@
+from google.api_core import exceptions
 from google.cloud import storage
 from datetime import datetime, timedelta, timezone
 
@@ -18,6 +19,78 @@ class StorageService:
         csv_string = df.to_csv(index=False)
         blob.upload_from_string(csv_string, content_type="text/csv")
 
+    def upload_bytes(self, destination_blob_name, data, content_type="application/octet-stream"):
+        """Uploads raw bytes to Google Cloud Storage."""
+
+        blob = self.bucket.blob(destination_blob_name)
+        blob.upload_from_string(data, content_type=content_type)
+
+    def download_bytes(self, blob_name):
+        """Downloads a blob as bytes, or returns None if it does not exist."""
+
+        blob = self.bucket.blob(blob_name)
+        try:
+            return blob.download_as_bytes()
+        except exceptions.NotFound:
+            return None
+
+    def open_writer(self, destination_blob_name, content_type="application/octet-stream", chunk_size=None):
+        """
+        Opens a file object that uploads to Google Cloud Storage in chunks, through a
+        resumable upload. The blob only becomes visible once the writer is closed;
+        its terminate() method cancels the upload instead.
+        """
+
+        blob = self.bucket.blob(destination_blob_name)
+        return blob.open(
+            "wb",
+            chunk_size=chunk_size or Config.EXPORT_UPLOAD_CHUNK_SIZE,
+            content_type=content_type,
+            ignore_flush=True,
+        )
+
+    def file_exists(self, file_name):
+        return self.bucket.blob(file_name).exists()
+
+    def acquire_lock(self, lock_name, ttl):
+        """
+        Creates `lock_name` only if it does not exist yet, so that a single caller
+        across all instances holds the lock. A lock older than `ttl` seconds is
+        considered abandoned and taken over.
+
+        :return: The generation of the lock blob (needed to release it), or None
+                 if the lock is held by someone else.
+        """
+
+        blob = self.bucket.blob(lock_name)
+        try:
+            blob.upload_from_string(b"", if_generation_match=0)
+            return blob.generation
+        except exceptions.PreconditionFailed:
+            pass
+
+        try:
+            blob.reload()
+        except exceptions.NotFound:
+            return self.acquire_lock(lock_name, ttl)
+        if (datetime.now(timezone.utc) - blob.updated) < timedelta(seconds=ttl):
+            return None
+
+        # Take over the abandoned lock; if another caller got there first, its
+        # generation no longer matches and we back off.
+        try:
+            blob.upload_from_string(b"", if_generation_match=blob.generation)
+            return blob.generation
+        except exceptions.PreconditionFailed:
+            return None
+
+    def release_lock(self, lock_name, generation):
+        blob = self.bucket.blob(lock_name)
+        try:
+            blob.delete(if_generation_match=generation)
+        except (exceptions.NotFound, exceptions.PreconditionFailed):
+            pass
+
     def generate_signed_url(self, blob_name):
         """Generates a signed URL for the blob."""
 
@@ -1,75 +1,242 @@
+import hashlib
 import json
 import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.api_core import exceptions
 from google.cloud import tasks_v2
 from ..config import Config
 
 
+class QueueState:
+    """
+    Periodically refreshed snapshot of the task queues.
+
+    Holds the task names of each queue and the ids of the authors they refer to,
+    so that queue depth and pending-author lookups are answered without listing
+    the queues on every request. The snapshot is rebuilt at most once every
+    `max_staleness` seconds and updated in place as this process enqueues tasks.
+    """
+
+    def __init__(self, tasks_client, queues, author_queue=None, max_staleness=None):
+        self.tasks_client = tasks_client
+        self.queues = list(queues)
+        self.author_queue = author_queue
+        self.max_staleness = Config.QUEUE_STATE_MAX_STALENESS if max_staleness is None else max_staleness
+        self._task_names = {queue: set() for queue in self.queues}
+        self._pending_authors = set()
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def author_id_from_task_name(self, queue, task_name):
+        # Author tasks are named after the scholar id, which may itself contain "__";
+        # publication tasks after the author_pub_id ("<scholar_id>:<pub_id>", with
+        # ":" replaced by "__") or the author of their chunk ("<scholar_id>__batch-...").
+        task_id = task_name.rsplit("/", 1)[-1]
+        if queue == self.author_queue:
+            return task_id
+        return task_id.rsplit("__", 1)[0]
+
+    def has_pending(self, author_id):
+        self._ensure_fresh()
+        with self._lock:
+            return author_id in self._pending_authors
+
+    def depth(self, queue=None):
+        self._ensure_fresh()
+        with self._lock:
+            if queue is not None:
+                return len(self._task_names.get(queue, ()))
+            return sum(len(names) for names in self._task_names.values())
+
+    def record_enqueued(self, queue, task_name):
+        with self._lock:
+            self._task_names.setdefault(queue, set()).add(task_name)
+            self._pending_authors.add(self.author_id_from_task_name(queue, task_name))
+
+    def refresh(self):
+        task_names = {}
+        for queue in self.queues:
+            try:
+                tasks = self.tasks_client.list_tasks(request={"parent": queue, "page_size": 1000})
+                task_names[queue] = {task.name for task in tasks}
+            except Exception as e:
+                logging.error(f"Error listing tasks for queue {queue}: {e}")
+                with self._lock:
+                    task_names[queue] = set(self._task_names.get(queue, ()))
+
+        pending_authors = {
+            self.author_id_from_task_name(queue, name) for queue, names in task_names.items() for name in names
+        }
+        with self._lock:
+            self._task_names = task_names
+            self._pending_authors = pending_authors
+            self._refreshed_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        refreshed_at = self._refreshed_at
+        if refreshed_at is not None and time.monotonic() - refreshed_at < self.max_staleness:
+            return
+        # Only one thread rebuilds the snapshot; the others keep serving the
+        # previous one, unless there is none yet.
+        if self._refresh_lock.acquire(blocking=refreshed_at is None):
+            try:
+                if self._refreshed_at == refreshed_at:
+                    self.refresh()
+            finally:
+                self._refresh_lock.release()
+
+
 class TaskQueueService:
-    def __init__(self):
-        self.tasks_client = tasks_v2.CloudTasksClient()
+    def __init__(self, tasks_client=None):
+        self.tasks_client = tasks_client or tasks_v2.CloudTasksClient()
         self.project_id = Config.PROJECT_ID
         self.queue_location = Config.QUEUE_LOCATION
         self.authors_queue_name = Config.QUEUE_NAME_AUTHORS
         self.pubs_queue_name = Config.QUEUE_NAME_PUBS
         self.authors_queue = self.tasks_client.queue_path(self.project_id, self.queue_location, self.authors_queue_name)
         self.pubs_queue = self.tasks_client.queue_path(self.project_id, self.queue_location, self.pubs_queue_name)
+        self.dedup_ttl = Config.TASK_DEDUP_TTL
+        self._recent_tasks = {}  # task name -> expiry (monotonic seconds)
+        self._recent_tasks_lock = threading.Lock()
+        self.queue_state = QueueState(
+            self.tasks_client, [self.authors_queue, self.pubs_queue], author_queue=self.authors_queue
+        )
 
     def enqueue_author_task(self, author_id):
+        return self._enqueue_task(self._author_task(author_id), self.authors_queue)
+
+    def iter_enqueue_author_tasks(self, author_ids, max_workers=None):
+        """
+        Enqueue author tasks concurrently, yielding the outcome of each as it completes.
+
+        :param author_ids: The Google Scholar IDs of the authors.
+        :param max_workers: Maximum number of concurrent create_task calls.
+        :return: An iterator of (author_id, status) pairs, where status is
+                 "enqueued", "duplicate" or "failed".
+        """
+        max_workers = max_workers or Config.ENQUEUE_MAX_WORKERS
+        author_ids = list(dict.fromkeys(author_ids))
+        if not author_ids:
+            return
+
+        def submit(author_id):
+            try:
+                task = self._create_task(
+                    self._author_task(author_id), self.authors_queue, retries=Config.ENQUEUE_MAX_RETRIES
+                )
+                return author_id, "enqueued" if task is not None else "duplicate"
+            except Exception as e:
+                logging.error(f"Error enqueuing author task for {author_id}: {e}")
+                return author_id, "failed"
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(author_ids))) as executor:
+            futures = [executor.submit(submit, author_id) for author_id in author_ids]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _author_task(self, author_id):
         task_name = f"{self.authors_queue}/tasks/{author_id}"
         url = Config.API_SEARCH_AUTHOR_ID
         payload = json.dumps({"scholar_id": author_id})
+        return self._create_http_task(task_name, url, payload)
 
-        if self._check_duplicate_task(task_name, self.authors_queue):
-            logging.info(f"Task for author_id {author_id} already enqueued.")
-            return None
+    def enqueue_publication_task(self, pub_entry):
+        return self._enqueue_task(self._publication_task(pub_entry), self.pubs_queue)
 
-        task = self._create_http_task(task_name, url, payload)
-        return self._enqueue_task(task, self.authors_queue)
+    def create_publication_task(self, pub_entry):
+        """
+        Enqueue a single publication task, retrying while Cloud Tasks is throttling.
 
-    def enqueue_publication_task(self, pub_entry):
+        Returns the created task, or None if it is a duplicate; unlike
+        enqueue_publication_task, errors are raised to the caller.
+        """
+        return self._create_task(self._publication_task(pub_entry), self.pubs_queue, retries=Config.ENQUEUE_MAX_RETRIES)
+
+    def _publication_task(self, pub_entry):
         task_id = pub_entry["author_pub_id"].replace(":", "__")
         task_name = f"{self.pubs_queue}/tasks/{task_id}"
         url = Config.API_FILL_PUBLICATION
         payload = json.dumps({"pub": pub_entry})
+        return self._create_http_task(task_name, url, payload)
 
-        if self._check_duplicate_task(task_name, self.pubs_queue):
-            logging.info(f"Task for publication {task_id} already enqueued.")
-            return None
+    def enqueue_publication_batch_task(self, pub_entries):
+        # One fill_publication task for a chunk of publications of the same author.
+        # The name is derived from the chunk's contents so re-enqueueing it is a no-op.
+        author_id = pub_entries[0]["author_pub_id"].split(":")[0]
+        pub_ids = ",".join(sorted(pub["author_pub_id"] for pub in pub_entries))
+        digest = hashlib.sha1(pub_ids.encode()).hexdigest()[:16]
+        task_name = f"{self.pubs_queue}/tasks/{author_id}__batch-{digest}"
+        url = Config.API_FILL_PUBLICATION
+        payload = json.dumps({"pubs": pub_entries})
 
         task = self._create_http_task(task_name, url, payload)
-        return self._enqueue_task(task, self.pubs_queue)
+        return self._create_task(task, self.pubs_queue, retries=Config.ENQUEUE_MAX_RETRIES)
 
-    def check_pending_tasks(self, author_id):
-        author_tasks = self.tasks_client.list_tasks(request={"parent": self.authors_queue})
-        for task in author_tasks:
-            if author_id in task.name:  # Assuming task names include the author_id
-                return True  # There are pending tasks for this author
+    def enqueue_publication_tasks(self, pub_entries, chunk_size=None, max_workers=None):
+        """
+        Enqueue publications as chunk tasks, creating the tasks concurrently.
 
-        pub_tasks = self.tasks_client.list_tasks(request={"parent": self.pubs_queue})
-        for task in pub_tasks:
-            if author_id in task.name:  # Assuming task names include the author_id
-                return True  # There are pending tasks for this author
-        return False  # No pending tasks for this author
+        :param pub_entries: The publication entries to enqueue.
+        :param chunk_size: Number of publications per task (defaults to Config.PUBS_PER_TASK).
+        :param max_workers: Maximum number of concurrent create_task calls.
+        :return: A dict with the number of chunks enqueued, skipped as duplicates,
+                 and the author_pub_ids of the publications that could not be enqueued.
+        """
+        chunk_size = chunk_size or Config.PUBS_PER_TASK
+        max_workers = max_workers or Config.ENQUEUE_MAX_WORKERS
+        pub_entries = [pub for pub in pub_entries if pub.get("author_pub_id")]
+        chunks = [pub_entries[i : i + chunk_size] for i in range(0, len(pub_entries), chunk_size)]
 
-    def get_number_of_tasks_in_queue(self):
-        total_tasks = 0
-        for queue in [self.authors_queue, self.pubs_queue]:
+        report = {"enqueued": 0, "duplicates": 0, "failed": []}
+        if not chunks:
+            return report
+
+        def submit(chunk):
             try:
-                tasks_iterator = self.tasks_client.list_tasks(request={"parent": queue})
-                for _ in tasks_iterator:
-                    total_tasks += 1
+                return chunk, self.enqueue_publication_batch_task(chunk), None
             except Exception as e:
-                print(f"Error listing tasks for queue {queue}: {e}")
-                # Optionally, handle the error by retrying, logging, or returning an error state.
-        return total_tasks
+                return chunk, None, e
 
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            for chunk, response, error in executor.map(submit, chunks):
+                if error is not None:
+                    logging.error(f"Error enqueuing publication chunk: {error}")
+                    report["failed"].extend(pub["author_pub_id"] for pub in chunk)
+                elif response is None:
+                    report["duplicates"] += 1
+                else:
+                    report["enqueued"] += 1
+        return report
 
-    def _check_duplicate_task(self, task_name, queue):
-        existing_tasks = self.tasks_client.list_tasks(request={"parent": queue})
-        for task in existing_tasks:
-            if task_name == task.name:
-                return True
-        return False
+    def check_pending_tasks(self, author_id):
+        # Answered from the shared queue snapshot, which may lag by up to
+        # Config.QUEUE_STATE_MAX_STALENESS seconds
+        return self.queue_state.has_pending(author_id)
+
+    def get_number_of_tasks_in_queue(self):
+        return self.queue_state.depth()
+
+    def _is_recently_enqueued(self, task_name):
+        now = time.monotonic()
+        with self._recent_tasks_lock:
+            expires_at = self._recent_tasks.get(task_name)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._recent_tasks[task_name]
+                return False
+            return True
+
+    def _remember_task(self, task_name):
+        now = time.monotonic()
+        with self._recent_tasks_lock:
+            self._recent_tasks[task_name] = now + self.dedup_ttl
+            if len(self._recent_tasks) > 10000:
+                self._recent_tasks = {name: exp for name, exp in self._recent_tasks.items() if exp > now}
 
     def _create_http_task(self, task_name, url, payload):
         return {
@@ -82,11 +249,46 @@ class TaskQueueService:
             },
         }
 
+    def _create_task(self, task, queue, retries=0):
+        """
+        Create a task, retrying with exponential backoff while Cloud Tasks is throttling.
+
+        Returns the created task, or None if a task with the same name already exists.
+        Other errors are raised to the caller.
+        """
+        # Task names are deterministic, so Cloud Tasks itself rejects duplicates
+        # with AlreadyExists; there is no need to list the queue beforehand.
+        task_name = task["name"]
+        if self._is_recently_enqueued(task_name):
+            logging.info(f"Task {task_name} was enqueued recently; skipping duplicate.")
+            return None
+
+        attempt = 0
+        while True:
+            try:
+                response = self.tasks_client.create_task(request={"parent": queue, "task": task})
+                break
+            except exceptions.AlreadyExists:
+                logging.info(f"Task {task_name} already enqueued.")
+                self._remember_task(task_name)
+                self.queue_state.record_enqueued(queue, task_name)
+                return None
+            except (exceptions.ResourceExhausted, exceptions.ServiceUnavailable, exceptions.DeadlineExceeded) as e:
+                if attempt >= retries:
+                    raise
+                delay = min(30, 0.5 * 2**attempt) * random.uniform(0.5, 1.5)
+                logging.warning(f"Throttled while enqueuing {task_name} ({e}); retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                attempt += 1
+
+        logging.info(f"Task enqueued: {response.name}")
+        self._remember_task(task_name)
+        self.queue_state.record_enqueued(queue, task_name)
+        return response
+
     def _enqueue_task(self, task, queue):
         try:
-            response = self.tasks_client.create_task(request={"parent": queue, "task": task})
-            logging.info(f"Task enqueued: {response.name}")
-            return response
+            return self._create_task(task, queue)
         except Exception as e:
             logging.error(f"Error enqueuing task: {e}")
             return None
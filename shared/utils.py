@@ -1,3 +1,7 @@
+from datetime import date, datetime
+from enum import Enum
+
+
 def convert_integers_to_strings(data):
     if isinstance(data, dict):
         return {key: convert_integers_to_strings(value) for key, value in data.items()}
@@ -10,3 +14,92 @@ def convert_integers_to_strings(data):
             return data
     else:
         return data
+
+
+# Integers beyond this magnitude are stored as strings (Firestore integers are 64-bit)
+MAX_STORED_INT = 2**62
+MAX_SERIALIZE_DEPTH = 512
+
+_SCALARS = (str, float, bool, type(None))
+_PLAIN_TYPES = frozenset([str, int, float, bool, type(None)])
+
+
+def _serialize_key(key):
+    # Dict keys as json.dumps writes them
+    if type(key) is str:
+        return key
+    if isinstance(key, Enum):
+        return _serialize_key(key.value)
+    if key is True or key is False:
+        return "true" if key else "false"
+    if key is None:
+        return "null"
+    return str(key)
+
+
+def _serialize_scalar(value):
+    """Return (serialized, True) for leaf values, or (None, False) for containers."""
+    if isinstance(value, _SCALARS):
+        if isinstance(value, str) and type(value) is not str:
+            value = value.value if isinstance(value, Enum) else str(value)
+        return value, True
+    if isinstance(value, int):
+        return (str(value) if abs(value) > MAX_STORED_INT else value), True
+    if isinstance(value, (dict, list, tuple, set, frozenset)):
+        return None, False
+    if isinstance(value, Enum):
+        return _serialize_scalar(value.value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(), True
+    return str(value), True
+
+
+def serialize_for_storage(obj, replace=None):
+    """
+    Convert a scholarly object to plain JSON-compatible data for Firestore, in one pass.
+
+    Equivalent to convert_integers_to_strings(json.loads(json.dumps(obj))) for JSON
+    data, without the intermediate copies: dict keys become strings, tuples and sets
+    lists, enums their values, dates ISO strings, other objects str(), and integers
+    beyond MAX_STORED_INT strings. The input is not modified.
+
+    :param replace: Optional mapping of top-level keys to functions applied to the
+                    raw value before it is serialized (to project large fields).
+    """
+    out, leaf = _serialize_scalar(obj)
+    if leaf:
+        return out
+    replace = replace or {}
+    root = [None]
+    stack = [(root, 0, obj, 0)]
+    while stack:
+        parent, key, value, depth = stack.pop()
+        if depth > MAX_SERIALIZE_DEPTH:
+            raise ValueError("Object too deep to serialize (circular reference?)")
+        if isinstance(value, dict):
+            out = {}
+            for k, v in value.items():
+                if depth == 0 and k in replace:
+                    v = replace[k](v)
+                if type(k) is not str:
+                    k = _serialize_key(k)
+                # Fast path for the common leaf types
+                t = type(v)
+                if t in _PLAIN_TYPES and (t is not int or -MAX_STORED_INT <= v <= MAX_STORED_INT):
+                    out[k] = v
+                    continue
+                out[k], leaf = _serialize_scalar(v)
+                if not leaf:
+                    stack.append((out, k, v, depth + 1))
+        else:
+            out = [None] * len(value)
+            for i, v in enumerate(value):
+                t = type(v)
+                if t in _PLAIN_TYPES and (t is not int or -MAX_STORED_INT <= v <= MAX_STORED_INT):
+                    out[i] = v
+                    continue
+                out[i], leaf = _serialize_scalar(v)
+                if not leaf:
+                    stack.append((out, i, v, depth + 1))
+        parent[key] = out
+    return root[0]
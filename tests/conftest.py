@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The shared package is imported from the repository root, the app modules from app/
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (REPO_ROOT, os.path.join(REPO_ROOT, "app")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
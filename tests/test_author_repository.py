@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from shared.config import Config
+from shared.repositories.author_repository import AuthorRepository
+
+
+class FakeFirestoreService:
+    """In-memory stand-in for the FirestoreService cache-document methods used by AuthorRepository."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def get_firestore_cache(self, collection, doc_id, use_local_cache=True):
+        return self.docs.get((collection, doc_id), (None, None))
+
+    def get_many(self, refs, use_local_cache=True):
+        return {ref: self.docs.get(ref, (None, None)) for ref in refs}
+
+    def set_firestore_cache(self, collection, doc_id, data, timestamp=None):
+        self.docs[(collection, doc_id)] = (data, timestamp or datetime.now(timezone.utc))
+        return True
+
+    def set_many(self, collection, docs):
+        for doc_id, data in docs.items():
+            self.set_firestore_cache(collection, doc_id, data)
+        return []
+
+    def delete_documents(self, collection, keep=None):
+        deleted = [key for key in self.docs if key[0] == collection and not (keep and keep(key[1]))]
+        for key in deleted:
+            del self.docs[key]
+        return len(deleted)
+
+    def shard_ids(self, collection):
+        return sorted(doc_id for c, doc_id in self.docs if c == collection)
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    monkeypatch.setattr(Config, "AUTHOR_INLINE_PUBLICATIONS_MAX", 4)
+    monkeypatch.setattr(Config, "AUTHOR_PUBLICATIONS_PER_SHARD", 2)
+    return AuthorRepository(FakeFirestoreService(), publication_repository=None)
+
+
+def author(num_publications):
+    return {
+        "name": "Test Author",
+        "publications": [{"author_pub_id": f"a1:{i}", "num_citations": i} for i in range(num_publications)],
+    }
+
+
+def test_large_author_is_stored_in_shards(repository):
+    assert repository._store_author("a1", author(5))
+
+    header = repository.get_author_header("a1")
+    assert "publications" not in header
+    assert header["publication_shards"]["count"] == 3
+    assert len(repository.firestore_service.shard_ids(repository.shard_collection("a1"))) == 3
+    assert repository.get_author("a1")["publications"] == author(5)["publications"]
+
+
+def test_author_that_shrinks_below_the_limit_leaves_no_shards(repository):
+    assert repository._store_author("a1", author(5))
+    assert repository._store_author("a1", author(3))
+
+    assert repository.firestore_service.shard_ids(repository.shard_collection("a1")) == []
+    stored = repository.get_author("a1")
+    assert "publication_shards" not in stored
+    assert stored["publications"] == author(3)["publications"]
@@ -0,0 +1,40 @@
+import json
+
+from exports import iter_csv, iter_jsonl, record_columns
+
+
+RECORDS = [
+    {"author_pub_id": "a1:1", "title": "First", "num_citations": 3, "num_citations_percentile": 0.5},
+    {"author_pub_id": "a1:2", "title": None, "num_citations": 0, "num_citations_percentile": float("nan")},
+    {"author_pub_id": "a1:3", "pub_year": 2020},
+]
+
+
+def decode(chunks):
+    return b"".join(chunks).decode("utf-8")
+
+
+def test_csv_writes_missing_values_as_empty_cells():
+    lines = decode(iter_csv(RECORDS, record_columns(RECORDS))).splitlines()
+
+    assert lines == [
+        "author_pub_id,title,num_citations,num_citations_percentile,pub_year",
+        "a1:1,First,3,0.5,",
+        "a1:2,,0,,",
+        "a1:3,,,,2020",
+    ]
+
+
+def test_jsonl_writes_nan_as_null():
+    rows = [json.loads(line) for line in decode(iter_jsonl(RECORDS)).splitlines()]
+
+    assert rows[1] == {"author_pub_id": "a1:2", "title": None, "num_citations": 0, "num_citations_percentile": None}
+
+
+def test_csv_chunks_split_between_rows():
+    records = [{"author_pub_id": f"a1:{i}", "title": "x" * 10} for i in range(50)]
+    chunks = list(iter_csv(records, record_columns(records), chunk_size=100))
+
+    assert len(chunks) > 1
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    assert decode(chunks).count("\n") == 51